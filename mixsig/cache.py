@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+def config_hash(msig, n_samples, sequence_code=None, epoch=0, stream=0):
+    """
+    A stable hash of everything that determines the samples generate_at(0 .. n_samples - 1, epoch, stream=stream)
+    of msig.
+
+    The run_label only names the output directory, so it is left out.
+    The seed is part of the hash; a signal created with seed=None gets a fresh seed, so it never hits the cache.
+    """
+    sigs_coeffs, features = msig._init_args
+    kwargs = {k: v for k, v in msig._init_kwargs.items() if k != 'run_label'}
+    entropy, spawn_key = msig._seed_key
+    key = {
+        'sigs_coeffs': sigs_coeffs,
+        'features': features,
+        'kwargs': kwargs,
+        'seed': [entropy, spawn_key],
+        'n_samples': n_samples,
+        'sequence_code': sequence_code,
+        'epoch': epoch,
+        'stream': stream,
+    }
+    blob = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+class DatasetCache:
+    """
+    Generated samples of a MixedSignal, stored as memory-mapped .npy shards.
+
+    The shards live in <cache_dir>/<config_hash>/, where cache_dir defaults to out/cache, next to the
+    out/<run_label> directories, so runs with different run_labels share it.
+    Shard k holds samples k * shard_size .. (k + 1) * shard_size - 1 as X_<k>.npy and y_<k>.npy.
+    A shard is written to a temporary file and renamed, so an interrupted run never leaves a partial shard behind.
+    """
+
+    def __init__(self, msig, n_samples, sequence_code=None, epoch=0, shard_size=1024, cache_dir=None, stream=0):
+        self.msig = msig
+        self.n_samples = n_samples
+        self.sequence_code = sequence_code
+        self.epoch = epoch
+        self.stream = stream
+        self.shard_size = shard_size
+        self.key = config_hash(msig, n_samples, sequence_code=sequence_code, epoch=epoch, stream=stream)
+        cache_dir = cache_dir or os.path.join(os.path.dirname(msig.out_dir), 'cache')
+        self.cache_dir = os.path.join(cache_dir, self.key)
+        self.n_shards = -(-n_samples // shard_size)
+        self._shards = {}
+
+    def _filenames(self, shard):
+        return (os.path.join(self.cache_dir, f'X_{shard:05d}.npy'),
+                os.path.join(self.cache_dir, f'y_{shard:05d}.npy'))
+
+    def has_shard(self, shard):
+        return all(os.path.exists(filename) for filename in self._filenames(shard))
+
+    @property
+    def is_complete(self):
+        return all(self.has_shard(shard) for shard in range(self.n_shards))
+
+    def build(self):
+        """Generate every missing shard."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for shard in range(self.n_shards):
+            if not self.has_shard(shard):
+                self._build_shard(shard)
+        return self
+
+    def _build_shard(self, shard):
+        start = shard * self.shard_size
+        stop = min(start + self.shard_size, self.n_samples)
+        X = y = None
+        for i, sample_id in enumerate(range(start, stop)):
+            Xi, yi = self.msig.generate_at(sample_id, epoch=self.epoch, sequence_code=self.sequence_code,
+                                           stream=self.stream)
+            if X is None:
+                X_tmp, y_tmp = (filename + '.tmp' for filename in self._filenames(shard))
+                X = open_memmap(X_tmp, mode='w+', dtype=Xi.dtype, shape=(stop - start,) + Xi.shape)
+                y = open_memmap(y_tmp, mode='w+', dtype=yi.dtype, shape=(stop - start,) + yi.shape)
+            X[i] = Xi
+            y[i] = yi
+        X.flush()
+        y.flush()
+        del X, y
+        for filename in self._filenames(shard):
+            os.replace(filename + '.tmp', filename)
+
+    def shard(self, shard):
+        """The (X, y) memmaps of a shard, generating it first if needed."""
+        shard = int(shard)
+        if shard not in self._shards:
+            if not self.has_shard(shard):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._build_shard(shard)
+            self._shards[shard] = tuple(np.load(filename, mmap_mode='r') for filename in self._filenames(shard))
+        return self._shards[shard]
+
+    def __len__(self):
+        return self.n_samples
+
+    def __getitem__(self, sample_ids):
+        """
+        Gather samples by index.
+
+        :param sample_ids: an int or a sequence of ints
+        :return: X, y for those samples
+        """
+        if np.ndim(sample_ids) == 0:
+            if not 0 <= sample_ids < self.n_samples:
+                raise IndexError(f'sample index out of range [0, {self.n_samples})')
+            X, y = self.shard(sample_ids // self.shard_size)
+            return X[sample_ids % self.shard_size], y[sample_ids % self.shard_size]
+
+        sample_ids = np.asarray(sample_ids)
+        if np.any((sample_ids < 0) | (sample_ids >= self.n_samples)):
+            raise IndexError(f'sample index out of range [0, {self.n_samples})')
+        shards = sample_ids // self.shard_size
+        X0, y0 = self.shard(shards[0])
+        X = np.empty((len(sample_ids),) + X0.shape[1:], dtype=X0.dtype)
+        y = np.empty((len(sample_ids),) + y0.shape[1:], dtype=y0.dtype)
+        for shard in np.unique(shards):
+            mask = shards == shard
+            Xs, ys = self.shard(shard)
+            X[mask] = Xs[sample_ids[mask] % self.shard_size]
+            y[mask] = ys[sample_ids[mask] % self.shard_size]
+        return X, y
+
+
+class BatchLRU:
+    """
+    Least recently used cache of (X, y) batches, bounded by the total bytes of the cached arrays.
+
+    A batch larger than max_bytes on its own is never cached.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._batches = OrderedDict()
+
+    def __len__(self):
+        return len(self._batches)
+
+    def __contains__(self, key):
+        return key in self._batches
+
+    def get(self, key):
+        batch = self._batches.get(key)
+        if batch is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._batches.move_to_end(key)
+        return batch
+
+    def put(self, key, batch):
+        nbytes = sum(a.nbytes for a in batch)
+        if key in self._batches:
+            self.nbytes -= sum(a.nbytes for a in self._batches.pop(key))
+        if nbytes > self.max_bytes:
+            return
+        while self.nbytes + nbytes > self.max_bytes:
+            _, evicted = self._batches.popitem(last=False)
+            self.nbytes -= sum(a.nbytes for a in evicted)
+        self._batches[key] = batch
+        self.nbytes += nbytes
+
+    def clear(self):
+        self._batches.clear()
+        self.nbytes = 0
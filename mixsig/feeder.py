@@ -0,0 +1,96 @@
+import time
+import numpy as np
+
+
+class WindowFeeder:
+    """
+    Online window of the most recent window_size points of a signal, for low latency inference.
+
+    Points are pushed one (or a few) at a time into a ring buffer of length 2 * window_size, where every point
+    is written twice, at i and i + window_size.  The latest window is then always the contiguous slice
+    buffer[i + 1:i + 1 + window_size], so push is O(1) per point and window() is a zero-copy view.
+
+    The window is shaped like the input of msig for the sequence code X part:
+    'xw1', 'xwf' -> (1, window_size, n_features)   (default)
+    'x1', 'xf'   -> (1, n_features)                 (the latest point only)
+    't1', 'tf'   -> (window_size, n_features)
+    """
+
+    def __init__(self, msig, window_size=None, sequence_code=None, latency_history=10000):
+        self.window_size = window_size or msig.window_size
+        if not self.window_size:
+            raise ValueError('window_size is required when msig has no window_size yet.')
+        self.n_features = msig.n_features
+        self.dtype = msig.dtype
+
+        X_code = (sequence_code or 'xwf').split('_')[0]
+        if X_code in ('xw1', 'xwf'):
+            self._shape = (1, self.window_size, self.n_features)
+        elif X_code in ('x1', 'xf'):
+            self._shape = (1, self.n_features)
+        elif X_code in ('t1', 'tf'):
+            self._shape = (self.window_size, self.n_features)
+        else:
+            raise NotImplementedError(X_code)
+        self._last_only = X_code in ('x1', 'xf')
+
+        self._buffer = np.zeros((2 * self.window_size, self.n_features), dtype=self.dtype)
+        self._pos = -1
+        self.n_pushed = 0
+
+        # push latencies (ns) of the last latency_history pushes.
+        self.n_pushes = 0
+        self._latencies = np.zeros(latency_history, dtype=np.int64)
+
+    @property
+    def ready(self):
+        """True once window_size points have been pushed."""
+        return self.n_pushed >= self.window_size
+
+    def push(self, points):
+        """
+        Append one point (n_features,) or several points (n, n_features).
+
+        :return: the current window (see window()), or None until window_size points have been pushed.
+        """
+        start = time.perf_counter_ns()
+        points = np.asarray(points, dtype=self.dtype).reshape(-1, self.n_features)
+        if len(points) > self.window_size:
+            self.n_pushed += len(points) - self.window_size
+            points = points[-self.window_size:]  # older points would be overwritten anyway.
+        w = self.window_size
+        for point in points:
+            self._pos = (self._pos + 1) % w
+            self._buffer[self._pos] = point
+            self._buffer[self._pos + w] = point
+        self.n_pushed += len(points)
+        window = self.window() if self.ready else None
+        self._latencies[self.n_pushes % len(self._latencies)] = time.perf_counter_ns() - start
+        self.n_pushes += 1
+        return window
+
+    def window(self):
+        """The most recent window_size points, oldest first, as a read-only view of the ring buffer."""
+        if not self.ready:
+            raise ValueError(f'only {self.n_pushed} of {self.window_size} points have been pushed.')
+        if self._last_only:
+            window = self._buffer[self._pos]
+        else:
+            start = self._pos + 1
+            window = self._buffer[start:start + self.window_size]
+        window = window.reshape(self._shape)
+        window.flags.writeable = False
+        return window
+
+    def latency_stats(self):
+        """Per push latency in seconds over the recent pushes: count, mean, p50, p99 and max."""
+        latencies = self._latencies[:min(self.n_pushes, len(self._latencies))] * 1e-9
+        if len(latencies) == 0:
+            return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        return {
+            'count': self.n_pushes,
+            'mean': float(np.mean(latencies)),
+            'p50': float(np.percentile(latencies, 50)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(np.max(latencies)),
+        }
@@ -0,0 +1,337 @@
+import numpy as np
+
+KERNELS = {}
+
+
+def register_kernel(name, kernel=None, derivatives=()):
+    """
+    Register a waveform kernel under name so it can be selected with the 'kernel' keyword of a wave.
+
+    kernel may be a Kernel subclass, or a plain function f(theta) of the phase argument
+    theta = w * t - p with period 2 pi.  For a plain function, derivatives is an optional sequence of its
+    derivatives with respect to theta, [f', f'', ...], used for the 'dxdt', 'd2xdt2', ... features.
+
+    Can also be used as a class decorator, @register_kernel('name').
+    """
+    if kernel is None:
+        def decorator(cls):
+            register_kernel(name, cls)
+            return cls
+        return decorator
+
+    if isinstance(kernel, type) and issubclass(kernel, Kernel):
+        kernel.name = name
+        KERNELS[name] = kernel
+    elif callable(kernel):
+        KERNELS[name] = type(f'{name.title()}Kernel', (FunctionKernel,), {
+            'name': name,
+            'funcs': (kernel, *derivatives),
+        })
+    else:
+        raise TypeError('kernel must be a Kernel subclass or a callable.')
+    return kernel
+
+
+def get_kernel(spec=None):
+    """
+    Build a kernel from a spec.
+
+    :param spec: None (sine), a registered name, a dict {'name': ..., **params} or a Kernel instance.
+    :return: a Kernel instance
+    """
+    if spec is None:
+        spec = 'sine'
+    if isinstance(spec, Kernel):
+        return spec
+    if isinstance(spec, str):
+        spec = {'name': spec}
+    params = dict(spec)
+    name = params.pop('name', 'sine')
+    if name not in KERNELS:
+        raise ValueError(f'Unknown kernel {name}. Use one of {sorted(KERNELS)}')
+    return KERNELS[name](**params)
+
+
+# uniformly spaced timestamps with at least this many points use uniform_sincos instead of np.sin/np.cos.
+PHASOR_MIN_TIMESTAMPS = 4096
+
+
+def uniform_spacing(timestamps):
+    """
+    Detect uniformly spaced timestamps, e.g. from the default (noise free) timesequence_generator.
+
+    :return: (t0, dt) if timestamps[k] == t0 + k * dt to within rounding, else None.
+    """
+    if timestamps.ndim != 1 or len(timestamps) < 2:
+        return None
+    t0, t1 = timestamps[0], timestamps[-1]
+    dt = (t1 - t0) / (len(timestamps) - 1)
+    if dt <= 0:
+        return None
+    steps = np.diff(timestamps)
+    if np.ptp(steps) > 4 * np.finfo(timestamps.dtype).eps * max(abs(t0), abs(t1)):
+        return None
+    return t0, dt
+
+
+def uniform_sincos(t0, dt, n, w, p, need_sin=True, need_cos=True, dtype=None):
+    """
+    sin and cos of theta_k = w * (t0 + k * dt) - p, k = 0 .. n-1, with O(sqrt(n)) transcendental calls.
+
+    The points are split into blocks of size b ~ sqrt(n).  With the rotation table r_j = exp(i w dt j), j < b,
+    and the block starts s_m = exp(i theta_(m b)), every point is a single complex product,
+    exp(i theta_(m b + j)) = s_m * r_j.
+    Both tables are evaluated directly with np.sin/np.cos, so no error accumulates from block to block
+    (unlike a running recurrence z_(k+1) = z_k * r_1).  The absolute error of each value is at most
+    about eps * (4 + max|theta|), where eps is the machine epsilon of dtype; i.e. the same order as
+    np.sin(w * t - p), whose argument already carries an eps * |theta| rounding error.
+
+    :return: sin, cos (either may be None if not needed), each with shape (n,)
+    """
+    dtype = np.dtype(dtype or np.float64)
+    block = int(np.ceil(np.sqrt(n)))
+    n_blocks = -(-n // block)
+
+    rot = np.arange(block) * (w * dt)
+    rot_cos = np.cos(rot).astype(dtype, copy=False)
+    rot_sin = np.sin(rot).astype(dtype, copy=False)
+    start = w * (t0 + np.arange(n_blocks) * (block * dt)) - p
+    start_cos = np.cos(start).astype(dtype, copy=False)[:, None]
+    start_sin = np.sin(start).astype(dtype, copy=False)[:, None]
+
+    sin = cos = None
+    if need_sin:
+        sin = np.multiply(start_sin, rot_cos)
+        sin += start_cos * rot_sin
+        sin = sin.ravel()[:n]
+    if need_cos:
+        cos = np.multiply(start_cos, rot_cos)
+        cos -= start_sin * rot_sin
+        cos = cos.ravel()[:n]
+    return sin, cos
+
+
+def phase_angle(timestamps, w, p, dtype=None):
+    """theta = w * t - p, computed in float64 and then cast to dtype with cast_phase."""
+    theta = np.multiply(w, timestamps, dtype=np.float64)
+    theta -= p
+    return cast_phase(theta, dtype)
+
+
+def cast_phase(theta, dtype=None):
+    """
+    Cast a float64 phase angle to dtype.
+
+    A float32 theta = w * t - p is only good to eps * |theta| (about 1e-2 at t ~ 1e4), so for a narrower dtype
+    theta is first wrapped into [-pi, pi] in float64.  The trig that follows in dtype is then as accurate as
+    a cast of the exact value, however large t gets (e.g. MixedSignal.stream).
+    """
+    dtype = np.dtype(dtype or theta.dtype)
+    if dtype.itemsize >= theta.dtype.itemsize:
+        return theta
+    theta -= (2.0 * np.pi) * np.rint(theta * (0.5 / np.pi))
+    return theta.astype(dtype)
+
+
+class Kernel:
+    """
+    A unit amplitude waveform f(t; w, p) and its analytic time derivatives.
+
+    Subclasses implement derivative(theta, timestamps, w, order), where theta = w * t - p.
+    All arguments broadcast, so w and p may be scalars or (batch, 1) / per-point arrays.
+    With a dtype narrower than float64, theta is only given modulo 2 pi (see cast_phase).
+    """
+
+    name = None
+
+    def __init__(self, **params):
+        self.params = params
+
+    @property
+    def config(self):
+        return {'name': self.name, **self.params}
+
+    def derivatives(self, timestamps, w, p, orders, dtype=None, cache=None):
+        """
+        Evaluate the requested derivative orders.
+
+        :param cache: optional dict owned by the caller, which kernels may use to reuse work between calls.
+        :return: dict of order -> (base, factor) such that d^k f / dt^k == base * factor.
+        """
+        theta = phase_angle(timestamps, w, p, dtype)
+        return {order: (self.derivative(theta, timestamps, w, order), 1) for order in orders}
+
+    def derivative(self, theta, timestamps, w, order):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return isinstance(other, Kernel) and type(self) is type(other) and self.params == other.params
+
+    def __repr__(self):
+        params = ', '.join(f'{k}={v}' for k, v in self.params.items())
+        return f'{self.__class__.__name__}({params})'
+
+
+class FunctionKernel(Kernel):
+    """Kernel built from a user supplied function of theta and (optionally) its derivatives."""
+
+    funcs = ()
+
+    def derivative(self, theta, timestamps, w, order):
+        if order >= len(self.funcs):
+            raise ValueError(f'Kernel {self.name} does not define derivative order {order}')
+        # chain rule: d^k/dt^k f(w t - p) = w^k f^(k)(theta)
+        return self.funcs[order](theta) * w ** order
+
+
+@register_kernel('sine')
+class SineKernel(Kernel):
+
+    def derivatives(self, timestamps, w, p, orders, dtype=None, cache=None):
+        # one sin and one cos, shared by every derivative:
+        # d^k/dt^k sin(theta) = w^k * (sin, cos, -sin, -cos)[k % 4]
+        need_sin = bool({0, 2} & set(orders))
+        need_cos = bool({1, 3} & set(orders))
+        if cache is not None and np.ndim(w) == 0 and np.ndim(p) == 0:
+            sin, cos = self._shifted_sincos(cache, timestamps, w, p, need_sin, need_cos, dtype)
+        else:
+            sin, cos = self._sincos(timestamps, w, p, need_sin, need_cos, dtype)
+        bases = {}
+        for order in orders:
+            factor = w ** order if order else 1
+            if order % 4 >= 2:
+                factor = -factor
+            bases[order] = (sin if order % 2 == 0 else cos, factor)
+        return bases
+
+    @staticmethod
+    def _sincos(timestamps, w, p, need_sin, need_cos, dtype):
+        if np.ndim(timestamps) == 1 and np.ndim(w) == 0 and np.ndim(p) == 0 \
+                and len(timestamps) >= PHASOR_MIN_TIMESTAMPS:
+            spacing = uniform_spacing(timestamps)
+            if spacing is not None:
+                return uniform_sincos(*spacing, len(timestamps), w, p, need_sin, need_cos, dtype=dtype)
+        theta = phase_angle(timestamps, w, p, dtype)
+        sin = np.sin(theta) if need_sin else None
+        cos = np.cos(theta, out=theta) if need_cos else None
+        return sin, cos
+
+    def _shifted_sincos(self, cache, timestamps, w, p, need_sin, need_cos, dtype):
+        """
+        Reuse sin(w t) and cos(w t) from a previous call with the same timestamps (same object) and frequency:
+        sin(w t - p) = sin(w t) cos(p) - cos(w t) sin(p)
+        cos(w t - p) = cos(w t) cos(p) + sin(w t) sin(p)
+        The result is always computed this way, whether or not the base arrays were cached, so the values
+        don't depend on the call history (see MixedSignal.generate_at).  Waves only pass a cache when w and the
+        timestamps are fixed, so a one-off evaluation never pays for the shift.
+        """
+        key = (w, np.dtype(dtype or timestamps.dtype))
+        if cache.get('timestamps') is not timestamps or cache.get('key') != key:
+            cache.clear()
+            cache['timestamps'] = timestamps
+            cache['key'] = key
+            cache['sin'], cache['cos'] = self._sincos(timestamps, w, 0.0, True, True, dtype)
+        base_sin, base_cos = cache['sin'], cache['cos']
+        if p == 0:
+            return base_sin, base_cos
+        cos_p, sin_p = np.cos(p), np.sin(p)
+        sin = cos = None
+        if need_sin:
+            sin = base_sin * cos_p
+            sin -= base_cos * sin_p
+        if need_cos:
+            cos = base_cos * cos_p
+            cos += base_sin * sin_p
+        return sin, cos
+
+
+@register_kernel('square')
+class SquareKernel(Kernel):
+
+    def derivative(self, theta, timestamps, w, order):
+        if order == 0:
+            return np.where(np.sin(theta) >= 0, 1.0, -1.0).astype(theta.dtype, copy=False)
+        return 0.0  # piecewise constant.
+
+
+@register_kernel('sawtooth')
+class SawtoothKernel(Kernel):
+
+    def derivative(self, theta, timestamps, w, order):
+        if order == 0:
+            return 2.0 * np.mod(theta / (2.0 * np.pi), 1.0) - 1.0
+        if order == 1:
+            return w / np.pi + np.zeros_like(theta)
+        return 0.0
+
+
+@register_kernel('triangle')
+class TriangleKernel(Kernel):
+    """Triangle wave with the same zeros and extrema as sin(theta)."""
+
+    def derivative(self, theta, timestamps, w, order):
+        u = np.mod(theta / (2.0 * np.pi) + 0.25, 1.0) - 0.5
+        if order == 0:
+            return 1.0 - 4.0 * np.abs(u)
+        if order == 1:
+            return -2.0 / np.pi * np.sign(u) * w
+        return 0.0
+
+
+@register_kernel('chirp')
+class ChirpKernel(Kernel):
+    """
+    Linear chirp, sin(w t - p + pi * rate * t^2).  The frequency increases by rate (Hz) per unit time.
+    """
+
+    def __init__(self, rate=1.0, **params):
+        super().__init__(rate=rate, **params)
+        self.rate = rate
+
+    def derivatives(self, timestamps, w, p, orders, dtype=None, cache=None):
+        phi = np.multiply(w, timestamps, dtype=np.float64)
+        phi -= p
+        phi += np.pi * self.rate * timestamps ** 2
+        phi = cast_phase(phi, dtype)
+        sin = np.sin(phi)
+        cos = np.cos(phi)
+        dphi = w + 2.0 * np.pi * self.rate * timestamps
+        ddphi = 2.0 * np.pi * self.rate
+        bases = {}
+        for order in orders:
+            if order == 0:
+                bases[order] = (sin, 1)
+            elif order == 1:
+                bases[order] = (cos * dphi, 1)
+            elif order == 2:
+                bases[order] = (cos * ddphi - sin * dphi ** 2, 1)
+            elif order == 3:
+                bases[order] = (-cos * dphi ** 3 - 3.0 * sin * dphi * ddphi, 1)
+            else:
+                raise ValueError(f'Kernel {self.name} does not define derivative order {order}')
+        return bases
+
+
+@register_kernel('damped_sine')
+class DampedSineKernel(Kernel):
+    """
+    Exponentially damped sine, exp(-damping * t) * sin(w t - p).
+
+    With c = -damping + i w, the k-th derivative is exp(-damping * t) * Im(c^k exp(i theta)).
+    """
+
+    def __init__(self, damping=1.0, **params):
+        super().__init__(damping=damping, **params)
+        self.damping = damping
+
+    def derivatives(self, timestamps, w, p, orders, dtype=None, cache=None):
+        theta = phase_angle(timestamps, w, p, dtype)
+        envelope = np.exp(-self.damping * timestamps)
+        sin = np.sin(theta) * envelope
+        cos = np.cos(theta) * envelope
+        c = -self.damping + 1j * np.asarray(w)
+        bases = {}
+        for order in orders:
+            ck = c ** order
+            bases[order] = (sin * ck.real + cos * ck.imag, 1)
+        return bases
@@ -1,18 +1,41 @@
 import os
+import copy
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+from numpy.lib.format import open_memmap
 from keras.utils import Sequence
 from .utils import get_datetime_now
 from .utils import string2shape
 from .utils import shape2string
 from .utils import timesequence_generator
+from .utils import spawn_generators
+from .utils import rebuild
 from .utils import create_one_hots_from_labels
 from .utils import one_hot_encode
+from .utils import sliding_windows
+from .utils import merge_sorted_blocks
 from .waves import Wave
 from .waves import MixedWave
+from .waves import WaveBank
+from .cache import DatasetCache
+from .cache import BatchLRU
+
+# First element of every spawn key derived from a signal's seed, so the key spaces of
+# generate_at samples, epoch shuffles and stateful rows can never collide.
+SAMPLE_KEY = 0
+SHUFFLE_KEY = 1
+STATEFUL_KEY = 2
 
 
 class MixedSignal:
+
+    # with backend='auto', signals with at least this many classes are generated with a WaveBank.
+    wavebank_min_classes = 32
+
     def __init__(self,
                  sigs_coeffs,
                  *features,
@@ -23,12 +46,46 @@ class MixedSignal:
                  sequence_type='many2many',
                  stateful=False,
                  run_label=None,
-                 name='Mixed'):
-
+                 name='Mixed',
+                 seed=None,
+                 bit_generator='PCG64',
+                 backend='auto',
+                 dtype=None,
+                 label_dtype=None,
+                 copy_windows=True):
+
+        # The constructor arguments, so the signal can be pickled (see __reduce__).
+        self._init_args = (copy.deepcopy(sigs_coeffs), features)
+        self._init_kwargs = dict(
+            batch_size=batch_size, window_size=window_size, window_type=window_type, network_type=network_type,
+            sequence_type=sequence_type, stateful=stateful, run_label=run_label, name=name,
+            bit_generator=bit_generator, backend=backend, dtype=dtype, label_dtype=label_dtype,
+            copy_windows=copy_windows)
+
+        # One independent generator for the signal itself, one for the mixed wave and one per wave.
+        # Passing the same seed reproduces the same signals.
+        self.seed = seed
+        self.bit_generator = bit_generator
+        seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        # the root of every random stream of this signal; see generate_at.
+        self._seed_key = (seed_seq.entropy, seed_seq.spawn_key)
+        # stream ids handed out by new_stream_id; 0 is left for direct generate_at calls.
+        self._n_streams = 0
+        self._rngs = spawn_generators(seed_seq, len(sigs_coeffs) + 2, bit_generator)
+        self.rng, mwave_rng, *wave_rngs = self._rngs
 
         self.features = features or ('x',)
         self.n_features = len(self.features)
 
+        # dtype of the timestamps and inputs (default float64),
+        # and of the labels and one-hots (default int labels and float64 one-hots).
+        self.dtype = np.dtype(dtype or np.float64)
+        self.label_dtype = None if label_dtype is None else np.dtype(label_dtype)
+        self.one_hot_dtype = self.dtype if label_dtype is None else self.label_dtype
+
+        # If False, generate_sliding returns read-only strided views of the signal instead of copies.
+        self.copy_windows = copy_windows
+
         if stateful:
             assert batch_size > 0
         else:
@@ -60,10 +117,13 @@ class MixedSignal:
 
         self.sequence_type = sequence_type
         self._sequence_code = None
-        assert self.sequence_type in ('one2one', 'one2many', 'many2one', 'many2many')
+        # many2one+time (PLSTM): each window also gets a channel with the time before the end of the window.
+        assert self.sequence_type in ('one2one', 'one2many', 'many2one', 'many2many', 'many2one+time')
+        if self.sequence_type == 'many2one+time' and self.window_type == 'boxcar':
+            raise ValueError('many2one+time is only implemented for sliding and random windows.')
 
         if 'time' in sigs_coeffs:
-            self.sequence_generator = timesequence_generator(**sigs_coeffs['time'])
+            self.sequence_generator = timesequence_generator(**sigs_coeffs['time'], rng=self.rng)
 
         mwave_indexes = []
         n_mixed_waves = 0
@@ -86,17 +146,40 @@ class MixedSignal:
             assert len(mwave_indexes) > 1, print('Need more than one wave for a mixed-wave')
             mwave_coeffs = sigs_coeffs.pop(mwave_idx)
             mwave_indexes = [i if i < mwave_idx else i - 1 for i in mwave_indexes]
-            self.mixed_wave = MixedWave(classes=mwave_indexes, mwave_coeffs=mwave_coeffs)
+            self.mixed_wave = MixedWave(classes=mwave_indexes, mwave_coeffs=mwave_coeffs, rng=mwave_rng)
         else:
             assert len(sigs_coeffs) == len(has_time)
             self.mixed_wave = None
 
-        self.waves = [Wave(*self.features, label=i, **coeffs) for i, coeffs in enumerate(sigs_coeffs)]
+        self.waves = [
+            Wave(*self.features, label=i, rng=rng, dtype=self.dtype, label_dtype=self.label_dtype, **coeffs)
+            for (i, coeffs), rng in zip(enumerate(sigs_coeffs), wave_rngs)
+        ]
         self.n_classes = len(self.waves)
 
+        self.backend = backend.lower()
+        assert self.backend in ('auto', 'waves', 'bank')
+        if self.backend == 'auto':
+            use_bank = self.n_classes >= self.wavebank_min_classes and WaveBank.supports(self.waves)
+        else:
+            use_bank = self.backend == 'bank'
+        if use_bank:
+            self.wave_bank = WaveBank(self.waves, rng=self.rng, dtype=self.dtype, label_dtype=self.label_dtype)
+        else:
+            self.wave_bank = None
+
+        # the generators generate() draws from, in self._rngs: the signal's, the mixed wave's and, with
+        # the WaveBank (which draws the properties and noise from the signal's), only those that time
+        # an independent wave.  generate_at only reseeds these.
+        if self.wave_bank is not None:
+            self._generate_rngs = [0, 1] + [2 + i for i, wave in enumerate(self.waves) if wave.is_independent]
+        else:
+            self._generate_rngs = list(range(len(self._rngs)))
+
         self.classification_type = 'binary' if self.n_classes == 1 else 'categorical'
 
         run_label = run_label or get_datetime_now(fmt='%Y_%m%d_%H%M')
+        self._init_kwargs['run_label'] = run_label
 
         self.data_config = {
             'run_label': run_label,
@@ -123,48 +206,36 @@ class MixedSignal:
         if self.mixed_wave:
             self.mixed_wave.generate()
 
-        # generate new waves.
-        timestamps = []
-        labels = []
-        inputs = []
-        for i, wave in enumerate(self.waves):
-            if self.mixed_wave and i in self.mixed_wave.classes:
-                indices = np.where(self.mixed_wave.labels == i)[0]
-                wave.generate(self.mixed_wave.timestamps, indices=indices, **self.mixed_wave.props)
-            else:
-                wave.generate()
-
-            timestamps.append(wave.timestamps)
-            labels.append(wave.labels)
-            inputs.append(wave.inputs)
-
-        timestamps = np.hstack(timestamps)
-        labels = np.hstack(labels)
-        inputs = np.vstack(inputs)
-
+        if self.wave_bank is not None:
+            blocks = self._generate_bank()
+        else:
+            blocks = self._generate_waves()
 
         window_size = self.window_size or 1
+        n_timestamps = sum(len(block[0]) for block in blocks)
 
         # clip data from the left so that it divides batch_size evenly.
         if self.window_type == 'boxcar':
-            assert len(timestamps) >= window_size * self.batch_size
-            chop_index = len(timestamps) % (window_size * self.batch_size)
+            assert n_timestamps >= window_size * self.batch_size
+            chop_index = n_timestamps % (window_size * self.batch_size)
         else:  # ('sliding' and 'random')
-            chop_index = (len(timestamps) - window_size + 1) % self.batch_size
-
-        # Sort the labels and mixed_signal chronologically.
-        sorted_indices = np.argsort(timestamps)[chop_index:]
+            chop_index = (n_timestamps - window_size + 1) % self.batch_size
 
-        self.timestamps = timestamps[sorted_indices]
-        self.labels = labels[sorted_indices]
-        self.inputs = inputs[sorted_indices]
+        # Merge the (already sorted) blocks chronologically.
+        timestamps, labels, inputs = merge_sorted_blocks(blocks, skip=chop_index)
+        if len(blocks) == 1 and self.wave_bank is None and not self.mixed_wave:
+            # a single independent wave: the merge returned views of the wave's own (possibly reused) arrays.
+            labels, inputs = labels.copy(), inputs.copy()
+        self.timestamps = timestamps.astype(self.dtype)
+        self.labels = labels
+        self.inputs = inputs
 
         self.n_timestamps = len(self.timestamps)
         if self._window_size is None:
             self.window_size = self.n_timestamps
 
         # self.one_hots = create_one_hots_from_labels(self.labels, self.n_classes)
-        self.one_hots = one_hot_encode(self.labels, self.n_classes)
+        self.one_hots = one_hot_encode(self.labels, self.n_classes, dtype=self.one_hot_dtype)
         self.mixed_signal = self.inputs[..., 0]
 
         # Sanity check
@@ -205,6 +276,53 @@ class MixedSignal:
         else:
             raise ValueError('Invalid window_type: {}. Use "sliding", "boxcar" or "random"')
 
+    def _generate_waves(self, t_shift=None):
+        """
+        Generate each wave in turn.
+
+        :param t_shift: if given, advance the waves to the block of a long recording starting t_shift later,
+        keeping their properties, instead of drawing new ones.
+        :return: list of (timestamps, labels, inputs) blocks, each sorted in time: the mixed wave (if any),
+        with every wave's share scattered back to its own indices, then each independent wave.
+        """
+        mixed = None
+        blocks = []
+        for i, wave in enumerate(self.waves):
+            if self.mixed_wave and i in self.mixed_wave.classes:
+                indices = np.where(self.mixed_wave.labels == i)[0]
+                if t_shift is None:
+                    wave.generate(self.mixed_wave.timestamps, indices=indices, **self.mixed_wave.props)
+                else:
+                    wave.advance(t_shift, self.mixed_wave.timestamps, indices=indices)
+                if mixed is None:
+                    n = len(self.mixed_wave.timestamps)
+                    mixed = (self.mixed_wave.timestamps,
+                             np.empty(n, dtype=wave.label_dtype),
+                             np.empty((n, self.n_features), dtype=wave.dtype))
+                mixed[1][indices] = wave.labels
+                mixed[2][indices] = wave.inputs
+                continue
+
+            if t_shift is None:
+                wave.generate()
+            else:
+                wave.advance(t_shift)
+            blocks.append((wave.timestamps, wave.labels, wave.inputs))
+
+        if mixed is not None:
+            blocks.insert(0, mixed)
+        return blocks
+
+    def _generate_bank(self):
+        """Generate all waves in one vectorized pass with the WaveBank, split back into time-sorted blocks."""
+        if self.mixed_wave:
+            arrays = self.wave_bank.generate(self.mixed_wave.timestamps, self.mixed_wave.labels,
+                                             **self.mixed_wave.props)
+        else:
+            arrays = self.wave_bank.generate()
+        splits = np.cumsum(self.wave_bank.block_sizes)[:-1]
+        return list(zip(*(np.split(a, splits) for a in arrays)))
+
     @property
     def n_samples(self):
         if self._n_samples is None:
@@ -276,7 +394,7 @@ class MixedSignal:
             't': self.n_timestamps,
             'x': self.n_samples,
             'w': self.window_size,
-            'f': self.n_features,
+            'f': self.n_input_features,
             'c': self.n_classes,
         }
 
@@ -427,7 +545,7 @@ class MixedSignal:
             't': self.n_timestamps,
             'x': self.n_samples,
             'w': self.window_size,
-            'f': self.n_features,
+            'f': self.n_input_features,
             'c': self.n_classes,
         }
 
@@ -437,6 +555,11 @@ class MixedSignal:
 
         return in_shape, out_shape
 
+    @property
+    def n_input_features(self):
+        """Channels of X: the features, plus the time channel with many2one+time."""
+        return self.n_features + 1 if self.sequence_type == 'many2one+time' else self.n_features
+
     @property
     def sequence_code(self):
 
@@ -444,7 +567,7 @@ class MixedSignal:
 
         if self._sequence_code is None:
 
-            in_seq, out_seq = self.sequence_type.split('2')
+            in_seq, out_seq = self.sequence_type.replace('+time', '').split('2')
             # sequence_type
             st = {'one': {'t0', 'x0'}, 'many': {'0t', 'xw'}}
 
@@ -461,9 +584,9 @@ class MixedSignal:
             if (in_seq == 'many' or out_seq == 'many') and self.window_size == 1:
                 raise ValueError('Only with one2one can you use a window_size == 1')
 
-            if self.n_features == 1:
+            if self.n_input_features == 1:
                 n_feats = ('1',)
-            elif self.n_features >= 2:
+            elif self.n_input_features >= 2:
                 n_feats = ('f',)
             else:
                 raise ValueError('n_features cannot be negative or zero')
@@ -495,14 +618,23 @@ class MixedSignal:
 
         return self._sequence_code
 
-    def generate_sliding(self, sequence_code=None):
+    def generate_sliding(self, sequence_code=None, copy=None):
+        """
+        Split the signal into overlapping windows.
+
+        :param copy: if False, the windowed arrays are read-only strided views of self.inputs, self.labels
+        and self.one_hots, so they take no extra memory (except 'xw1' labels, which view a float copy of
+        self.labels unless label_dtype is set).  Defaults to self.copy_windows.
+        """
+        copy = self.copy_windows if copy is None else copy
 
         if self.sequence_type == 'many2one+time':
-            # PLSTM: many2one (1088, 100, 2) -> (1088, 3)
-            X = np.zeros((self.n_samples, self.window_size, 2))
-            for j in range(self.window_size):
-                X[:, j, 0] = self.mixed_signal[j:j + self.n_samples]
-                X[:, j, 1] = self.timestamps[j + self.n_samples - 1] - self.timestamps[j:j + self.n_samples]
+            # PLSTM: many2one (1088, 100, n_features + 1) -> (1088, 3)
+            # The last channel is the time from each step to the last step of its window.
+            X = np.empty((self.n_samples, self.window_size, self.n_features + 1), dtype=self.dtype)
+            X[..., :-1] = sliding_windows(self.inputs, self.window_size, copy=False)
+            t = sliding_windows(self.timestamps, self.window_size, copy=False)
+            np.subtract(t[:, -1:], t, out=X[..., -1])
             y = self.one_hots[self.window_size - 1:]
             return X, y
 
@@ -514,9 +646,7 @@ class MixedSignal:
         elif X_code in ('x1', 'xf'):
             X = self.inputs[self.window_size - 1:]
         elif X_code in ('xw1', 'xwf'):
-            X = np.zeros((self.n_samples, self.window_size, self.n_features))
-            for j in range(self.window_size):
-                X[:, j] = self.inputs[j:j + self.n_samples]
+            X = sliding_windows(self.inputs, self.window_size, copy=copy)
         else:
             raise NotImplementedError(X_code)
 
@@ -525,18 +655,16 @@ class MixedSignal:
         elif y_code in ('x1',):
             y = self.labels[self.window_size - 1:, None]
         elif y_code == 'xw1':
-            y = np.zeros((self.n_samples, self.window_size, 1))
-            for j in range(self.window_size):
-                y[:, j, 0] = self.labels[j:j + self.n_samples]
+            # windows of labels as floats (label_dtype if given), like the one-hots.
+            labels = self.labels[..., None].astype(self.one_hot_dtype, copy=False)
+            y = sliding_windows(labels, self.window_size, copy=copy)
 
         elif y_code in ('tc',):
             y = self.one_hots
         elif y_code in ('xc',):
             y = self.one_hots[self.window_size - 1:]
         elif y_code == 'xwc':
-            y = np.zeros((self.n_samples, self.window_size, self.n_classes))
-            for j in range(self.window_size):
-                y[:, j] = self.one_hots[j:j + self.n_samples]
+            y = sliding_windows(self.one_hots, self.window_size, copy=copy)
         else:
             raise NotImplementedError(y_code)
 
@@ -601,27 +729,243 @@ class MixedSignal:
 
         return X, y
 
-    def generate_samples(self, n_samples, sequence_code=None):
-        # This is best suited for generating data where
-        # window_size == n_timestamps.
-        # and when using TCN's.
+    def generate_samples(self, n_samples, sequence_code=None, out=None):
+        """
+        Generate n_samples signals and stack them.
 
-        # The shape of Xi and yi should be,
-        # Xi.shape == (n_timestamps, n_features)
-        # yi.shape == (n_timestamps, n_classes)
-        # and the final output shape should be,
-        # X.shape == (n_samples, n_timestamps, n_features)
-        # y.shape == (n_samples, n_timestamps, n_classes)
+        This is best suited for generating data where window_size == n_timestamps, and when using TCN's.
+        The shape of Xi and yi should be,
+        Xi.shape == (n_timestamps, n_features)
+        yi.shape == (n_timestamps, n_classes)
+        and the final output shape should be,
+        X.shape == (n_samples, n_timestamps, n_features)
+        y.shape == (n_samples, n_timestamps, n_classes)
+
+        Each sample is still a full generate() call; only the stacking is done in place.  To draw many
+        realizations of a single wave in one vectorized pass, use Wave.generate_batch.
+        The sample shape is taken from the first sample, since n_timestamps (and so in_out_shape_decoder)
+        is only known once the signal has been generated.
+
+        :param out: optional (X, y) pair of preallocated arrays to write into.
+        Their leading dimension must be n_samples and the rest must match a single sample.
+        :return: X, y
+        """
 
         if n_samples < 1:
             raise ValueError('n_samples must be >= 1')
-        X = []
-        y = []
-        for i in range(n_samples):
+
+        # Each sample is written straight into its slot, so the windows don't need to be copied first.
+        copy_windows = self.copy_windows
+        self.copy_windows = False
+        try:
             Xi, yi = self.generate(sequence_code=sequence_code)
-            X.append(Xi)
-            y.append(yi)
-        return np.stack(X), np.stack(y)
+            if out is None:
+                X = np.empty((n_samples,) + Xi.shape, dtype=Xi.dtype)
+                y = np.empty((n_samples,) + yi.shape, dtype=yi.dtype)
+            else:
+                X, y = out
+                if X.shape != (n_samples,) + Xi.shape or y.shape != (n_samples,) + yi.shape:
+                    raise ValueError(f'out shapes {X.shape}, {y.shape} do not match '
+                                     f'{(n_samples,) + Xi.shape}, {(n_samples,) + yi.shape}')
+            X[0] = Xi
+            y[0] = yi
+            for i in range(1, n_samples):
+                X[i], y[i] = self.generate(sequence_code=sequence_code)
+        finally:
+            self.copy_windows = copy_windows
+        return X, y
+
+    def iter_samples(self, n_samples, chunk_size=1024, sequence_code=None):
+        """
+        Generate n_samples signals in chunks of at most chunk_size.
+
+        Memory stays constant: every chunk is written into the same pair of buffers,
+        so copy a chunk if you need to keep it past the next iteration.
+
+        :return: iterator of (X, y) with shapes (chunk, ...) like generate_samples
+        """
+        if n_samples < 1:
+            raise ValueError('n_samples must be >= 1')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be >= 1')
+
+        X, y = self.generate_samples(min(chunk_size, n_samples), sequence_code=sequence_code)
+        yield X, y
+        for start in range(len(X), n_samples, len(X)):
+            k = min(len(X), n_samples - start)
+            yield self.generate_samples(k, sequence_code=sequence_code, out=(X[:k], y[:k]))
+
+    def save_samples(self, n_samples, chunk_size=1024, sequence_code=None, out_dir=None):
+        """
+        Stream n_samples signals to X.npy and y.npy in out_dir (default self.out_dir),
+        so datasets larger than memory can be built.  Load them with np.load(..., mmap_mode='r').
+
+        :return: the X and y filenames
+        """
+        out_dir = out_dir or self.out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        x_filename = os.path.join(out_dir, 'X.npy')
+        y_filename = os.path.join(out_dir, 'y.npy')
+
+        X = y = None
+        start = 0
+        for X_chunk, y_chunk in self.iter_samples(n_samples, chunk_size=chunk_size, sequence_code=sequence_code):
+            if X is None:
+                X = open_memmap(x_filename, mode='w+', dtype=X_chunk.dtype, shape=(n_samples,) + X_chunk.shape[1:])
+                y = open_memmap(y_filename, mode='w+', dtype=y_chunk.dtype, shape=(n_samples,) + y_chunk.shape[1:])
+            X[start:start + len(X_chunk)] = X_chunk
+            y[start:start + len(y_chunk)] = y_chunk
+            start += len(X_chunk)
+        X.flush()
+        y.flush()
+        del X, y
+        return x_filename, y_filename
+
+    def __reduce__(self):
+        """
+        Pickle the signal as its constructor arguments and the states of its random generators.
+        Generated data is not pickled; call generate() again on the copy.
+        """
+        sigs_coeffs, features = self._init_args
+        entropy, spawn_key = self._seed_key
+        kwargs = {**self._init_kwargs, 'seed': np.random.SeedSequence(entropy, spawn_key=spawn_key)}
+        return rebuild, (self.__class__, (copy.deepcopy(sigs_coeffs), *features), kwargs,
+                         [rng.bit_generator.state for rng in self._generators()])
+
+    def _generators(self):
+        return self._rngs
+
+    def reseed(self, seed, rngs=None):
+        """
+        Restart every random stream of the signal from seed (an int or a np.random.SeedSequence).
+        The generators are reset in place, so the waves keep using them.
+
+        Only one SeedSequence is hashed, however many generators there are: generator i restarts from the
+        stream of seed, advanced by i * 2 ** 64 draws (far more than a signal draws per reseed).
+        Bit generators that can't advance (e.g. MT19937) get the i-th child of seed instead.
+
+        :param rngs: optional indices into self._rngs, to reseed only those generators.  Generator i
+        gets the same stream either way.
+        """
+        seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        bit_generator = getattr(np.random, self.bit_generator)
+        rngs = range(len(self._rngs)) if rngs is None else rngs
+        if not hasattr(bit_generator, 'advance'):
+            for i in rngs:
+                child = np.random.SeedSequence(seed_seq.entropy, spawn_key=(*seed_seq.spawn_key, i))
+                self._rngs[i].bit_generator.state = bit_generator(child).state
+            return
+        state = bit_generator(seed_seq).state
+        for i in rngs:
+            self._rngs[i].bit_generator.state = state
+            if i:
+                self._rngs[i].bit_generator.advance(i * 2 ** 64)
+
+    def seed_sequence(self, *key):
+        """
+        The SeedSequence of key under the seed of this signal.
+        Start key with one of SAMPLE_KEY, SHUFFLE_KEY or STATEFUL_KEY, so different uses never share a stream.
+        """
+        entropy, spawn_key = self._seed_key
+        return np.random.SeedSequence(entropy, spawn_key=(*spawn_key, *key))
+
+    def new_stream_id(self):
+        """A stream id (for generate_at) that no other generator of this signal has been given yet."""
+        self._n_streams += 1
+        return self._n_streams
+
+    def generate_at(self, index, epoch=0, sequence_code=None, stream=0):
+        """
+        Generate sample index of epoch, as a pure function of (seed, stream, epoch, index).
+
+        The random streams are reseeded from a SeedSequence keyed by (stream, epoch, index), so any sample can be
+        regenerated on its own, in any order or in any worker, without replaying the samples before it.
+        Generators over the same signal (e.g. training and validation) use different streams, so they don't
+        see the same samples.
+        """
+        self.reseed(self.seed_sequence(SAMPLE_KEY, stream, epoch, index), rngs=self._generate_rngs)
+        return self.generate(sequence_code=sequence_code)
+
+    def stream(self, n_chunks=None):
+        """
+        Generate one continuous recording block by block, forever (or for n_chunks blocks).
+
+        Block k is one generate() worth of timestamps, shifted by k times the block period (see _block_span), so the
+        time configs of the mixed wave and of every independent wave must have the same period.  The wave properties
+        (amplitude, frequency, offset and phase) are drawn once for the first block and carried forward, so each
+        wave runs on without a discontinuity from one block to the next.  Only the new block is computed per step.
+
+        :return: iterator of (timestamps, labels, inputs), each block sorted in time.
+        """
+        span = self._block_span()
+        k = 0
+        while n_chunks is None or k < n_chunks:
+            if self.mixed_wave:
+                if k == 0:
+                    self.mixed_wave.generate()
+                else:
+                    self.mixed_wave.advance(k * span)
+            blocks = self._generate_waves(t_shift=k * span if k else None)
+            timestamps, labels, inputs = merge_sorted_blocks(blocks)
+            if len(blocks) == 1 and not self.mixed_wave:
+                labels, inputs = labels.copy(), inputs.copy()
+            if self.label_dtype is not None:
+                labels = labels.astype(self.label_dtype, copy=False)
+            yield timestamps.astype(self.dtype, copy=False), labels, inputs
+            k += 1
+
+    def _block_span(self):
+        """
+        The time shift from one block of a long recording to the next, t_max - t_min.
+        Time sequences that start on t_min and end on t_max (pareto, or endpoint=True) are shifted by one more
+        (mean) step, (t_max - t_min) / (n - 1), so the first timestamp of a block doesn't repeat the last one
+        of the block before.
+        """
+        time_coeffs = [wave._init_kwargs['time'] for wave in self.waves if wave.is_independent]
+        if self.mixed_wave:
+            time_coeffs.append(self.mixed_wave._init_kwargs['mwave_coeffs']['time'])
+        spans = set()
+        for tc in time_coeffs:
+            span = tc['t_max'] - tc['t_min']
+            if (tc.get('noise_type') or '').lower() in ('pareto', 'large') or tc.get('endpoint', False):
+                span += span / ((tc.get('n_max') or tc['n_timestamps']) - 1)
+            spans.add(span)
+        if len(spans) != 1:
+            raise ValueError(f'All time sequences need the same block period to be chunked, found {sorted(spans)}')
+        return spans.pop()
+
+    def generate_chunked(self, n_chunks, out_dir=None):
+        """
+        Generate n_chunks consecutive blocks of one long recording (see stream)
+        and write them to memory-mapped .npy files.  Only one block is held in memory at a time.
+
+        The files are written to out_dir (default self.out_dir)/chunked.  Window the result without loading it,
+        e.g. sliding_windows(inputs, window_size, copy=False) reads only the rows of the windows you index.
+
+        :return: timestamps, labels, inputs; read-only memmaps with n_chunks * n_timestamps rows.
+        """
+        if n_chunks < 1:
+            raise ValueError('n_chunks must be >= 1')
+        out_dir = os.path.join(out_dir or self.out_dir, 'chunked')
+        os.makedirs(out_dir, exist_ok=True)
+        filenames = [os.path.join(out_dir, f'{name}.npy') for name in ('timestamps', 'labels', 'inputs')]
+
+        arrays = None
+        n = 0
+        for k, blocks in enumerate(self.stream(n_chunks)):
+            if arrays is None:
+                n = len(blocks[0])
+                arrays = [open_memmap(filename, mode='w+', dtype=block.dtype, shape=(n_chunks * n,) + block.shape[1:])
+                          for filename, block in zip(filenames, blocks)]
+            elif len(blocks[0]) != n:
+                raise ValueError('chunked generation needs a fixed number of timestamps per block (n_min == n_max).')
+            for array, block in zip(arrays, blocks):
+                array[k * n:(k + 1) * n] = block
+
+        for array in arrays:
+            array.flush()
+        del arrays
+        return tuple(np.load(filename, mmap_mode='r') for filename in filenames)
 
     def save_config(self):
         os.makedirs(self.out_dir, exist_ok=True)
@@ -629,14 +973,131 @@ class MixedSignal:
             json.dump(self.data_config, ofs, indent=4)
 
 
+_worker = threading.local()
+
+
+def _init_worker(msig, ring=None):
+    # Each worker (thread or process) generates from its own copy of the signal.
+    # Samples are keyed by (epoch, index), so it doesn't matter which worker generates which batch.
+    _worker.msig = copy.deepcopy(msig)
+    if ring is not None:
+        _worker.ring = BatchRing.attach(*ring)
+
+
+def _worker_batch(sample_ids, stream, epoch, in_batch_shape, out_batch_shape, dtype, label_dtype, inout_shape_code,
+                  slot=None):
+    if slot is None:
+        return _generate_batch(_worker.msig, sample_ids, stream, epoch, in_batch_shape, out_batch_shape,
+                               dtype, label_dtype, inout_shape_code)
+    # write straight into the shared ring; only the batch length goes back through the pipe.
+    n = len(sample_ids)
+    out = (_worker.ring.X[slot, :n], _worker.ring.y[slot, :n])
+    _generate_batch(_worker.msig, sample_ids, stream, epoch, in_batch_shape, out_batch_shape,
+                    dtype, label_dtype, inout_shape_code, out=out)
+    return n
+
+
+def _generate_batch(msig, sample_ids, stream, epoch, in_batch_shape, out_batch_shape, dtype, label_dtype,
+                    inout_shape_code, out=None):
+    n = len(sample_ids)
+    if out is None:
+        X = np.empty((n,) + in_batch_shape[1:], dtype=dtype)
+        y = np.empty((n,) + out_batch_shape[1:], dtype=label_dtype)
+    else:
+        X, y = out
+    for i, sample_id in enumerate(sample_ids):
+        X[i], y[i] = msig.generate_at(sample_id, epoch=epoch, sequence_code=inout_shape_code, stream=stream)
+    return X, y
+
+
+class BatchRing:
+    """
+    A ring of n_slots preallocated (X, y) batch slots in shared memory.
+
+    Worker processes attach to the ring by name and write whole batches into its slots,
+    so batches reach the consumer without being pickled.
+    """
+
+    def __init__(self, n_slots, in_batch_shape, out_batch_shape, dtype, label_dtype, shms=None):
+        self.n_slots = n_slots
+        self.in_batch_shape = in_batch_shape
+        self.out_batch_shape = out_batch_shape
+        self.dtype = np.dtype(dtype)
+        self.label_dtype = np.dtype(label_dtype)
+        x_shape = (n_slots,) + tuple(in_batch_shape)
+        y_shape = (n_slots,) + tuple(out_batch_shape)
+        self.owner = shms is None
+        if self.owner:
+            shms = (
+                shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(x_shape)) * self.dtype.itemsize)),
+                shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(y_shape)) * self.label_dtype.itemsize)),
+            )
+        self.shms = shms
+        self.X = np.ndarray(x_shape, dtype=self.dtype, buffer=shms[0].buf)
+        self.y = np.ndarray(y_shape, dtype=self.label_dtype, buffer=shms[1].buf)
+
+    @property
+    def spec(self):
+        """Arguments for BatchRing.attach."""
+        return (self.n_slots, self.in_batch_shape, self.out_batch_shape, self.dtype, self.label_dtype,
+                tuple(shm.name for shm in self.shms))
+
+    @classmethod
+    def attach(cls, n_slots, in_batch_shape, out_batch_shape, dtype, label_dtype, names):
+        shms = tuple(shared_memory.SharedMemory(name=name) for name in names)
+        return cls(n_slots, in_batch_shape, out_batch_shape, dtype, label_dtype, shms=shms)
+
+    def close(self):
+        self.X = self.y = None
+        for shm in self.shms:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # the consumer still holds a view; the mapping goes away with it.
+            if self.owner:
+                shm.unlink()
+        self.shms = ()
+
+
 class SignalGenerator(Sequence):
     def __init__(self,
                  n_samples,
                  batch_size,
                  msig,
-                 inout_shape_code='tf_tc'):
-
-        """Initialization"""
+                 inout_shape_code='tf_tc',
+                 n_workers=0,
+                 prefetch=2,
+                 use_processes=False,
+                 shared_memory=False,
+                 shuffle=False,
+                 cache=None,
+                 frozen=False,
+                 memory_budget=2 ** 30,
+                 stream=None):
+
+        """
+        Initialization
+
+        :param n_workers: number of background workers generating batches. 0 generates each batch in __getitem__.
+        :param prefetch: number of batches the workers keep ready ahead of the one being requested.
+        :param use_processes: use worker processes instead of threads.
+        :param shared_memory: with use_processes, workers write batches into a shared memory BatchRing
+        and __getitem__ returns views of it.  A view is only valid until the next __getitem__ or on_epoch_end.
+        :param shuffle: shuffle the sample order every epoch.
+        :param cache: True or a DatasetCache to serve batches from memory-mapped shards on disk.
+        The shards are generated once (the samples of epoch 0), so every epoch sees the same samples.
+        :param frozen: every epoch serves the same samples (those of epoch 0 of this stream), e.g. for a stable
+        validation set next to a training generator over the same msig.
+        Batches are kept in memory in an LRU of at most memory_budget bytes; evicted batches are read from
+        the cache or regenerated, which gives exactly the same data.
+        :param memory_budget: byte budget of the frozen batch LRU.
+        :param stream: stream id of the samples.  Defaults to a new one from msig.new_stream_id(), so every
+        generator over msig (e.g. training and validation) gets its own samples.
+
+        Sample i of epoch e is msig.generate_at(i, epoch=e, stream=stream), so a batch only depends on the seed
+        of msig, the stream, the epoch and its index; not on the batches generated before it or on which worker
+        generated it.
+        """
         self.n_samples = n_samples
         self.batch_size = batch_size
 
@@ -645,10 +1106,34 @@ class SignalGenerator(Sequence):
         self.in_batch_shape = (batch_size,) + in_shape
         self.out_batch_shape = (batch_size,) + out_shape
 
+        self.msig = msig
         self.generate = msig.generate
-
-        self.indexes = np.arange(n_samples)
-        # self.on_epoch_end()
+        self.dtype = msig.dtype
+        self.label_dtype = msig.label_dtype or int
+
+        if shared_memory and not use_processes:
+            raise ValueError('shared_memory requires use_processes=True; threads already share batches.')
+
+        # not 'workers', which is keras' own (Py)Dataset multiprocessing option.
+        self.n_workers = n_workers
+        self.prefetch = prefetch
+        self.use_processes = use_processes
+        self.shared_memory = shared_memory
+        self.shuffle = shuffle
+        self.stream = msig.new_stream_id() if stream is None else stream
+        self.epoch = 0
+        if cache is True:
+            cache = DatasetCache(msig, n_samples, sequence_code=inout_shape_code, stream=self.stream)
+        self.cache = cache or None
+        self.frozen = frozen
+        self.batch_lru = BatchLRU(memory_budget) if frozen else None
+        self._executor = None
+        self._pending = {}
+        self._ring = None
+        self._free_slots = []
+        self._held_slot = None
+
+        self.indexes = self._epoch_indexes()
 
     def __len__(self):
         """Denotes the number of batches per epoch"""
@@ -661,21 +1146,197 @@ class SignalGenerator(Sequence):
         indexes = self.indexes[index * self.batch_size:(index + 1) * self.batch_size]
 
         # Generate and return the data
-        X, y = self._batch_generator(indexes)
+        if self.batch_lru is not None:
+            batch = self.batch_lru.get(index)
+            if batch is not None:
+                return batch
+
+        if self.cache is not None:
+            X, y = self.cache[indexes]
+            X, y = X.astype(self.dtype, copy=False), y.astype(self.label_dtype, copy=False)
+        elif self.n_workers > 0:
+            X, y = self._prefetched_batch(index)
+        else:
+            X, y = self._batch_generator(indexes)
+
+        if self.batch_lru is not None:
+            if self._ring is not None:
+                X, y = X.copy(), y.copy()  # don't keep views of the ring.
+            self.batch_lru.put(index, (X, y))
 
         return X, y
 
+    @property
+    def sample_epoch(self):
+        """The epoch the samples are drawn from; always 0 when frozen."""
+        return 0 if self.frozen else self.epoch
+
     def on_epoch_end(self):
         """Updates indexes after each epoch"""
-        self.indexes = np.arange(self.n_samples)
+        self.close()
+        self.epoch += 1
+        if self.shuffle:
+            self.indexes = self._epoch_indexes()
+            if self.batch_lru is not None:
+                self.batch_lru.clear()  # the batches hold different samples now.
+
+    def _epoch_indexes(self):
+        indexes = np.arange(self.n_samples)
+        if self.shuffle:
+            seed = self.msig.seed_sequence(SHUFFLE_KEY, self.stream, self.epoch)
+            np.random.default_rng(seed).shuffle(indexes)
+        return indexes
+
+    def close(self):
+        """Stop the background workers, dropping any batches they prepared."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending = {}
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        self._free_slots = []
+        self._held_slot = None
+
+    def __del__(self):
+        if getattr(self, '_executor', None) is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if getattr(self, '_ring', None) is not None:
+            self._ring.close()
+
+    def _start_workers(self):
+        executor = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        initargs = (self.msig,)
+        if self.shared_memory:
+            # one slot per queued batch, plus the one being generated and the one held by the consumer.
+            n_slots = self.prefetch + 2
+            self._ring = BatchRing(n_slots, self.in_batch_shape, self.out_batch_shape, self.dtype, self.label_dtype)
+            self._free_slots = list(range(n_slots))
+            initargs += (self._ring.spec,)
+        self._executor = executor(max_workers=self.n_workers, initializer=_init_worker, initargs=initargs)
+
+    def _submit(self, index):
+        sample_ids = self.indexes[index * self.batch_size:(index + 1) * self.batch_size]
+        slot = self._free_slots.pop() if self._ring is not None else None
+        future = self._executor.submit(_worker_batch, sample_ids, self.stream, self.sample_epoch, self.in_batch_shape,
+                                       self.out_batch_shape, self.dtype, self.label_dtype, self.inout_shape_code, slot)
+        self._pending[index] = (future, slot)
+
+    def _drop(self, index):
+        future, slot = self._pending.pop(index)
+        if not future.cancel():
+            future.exception()  # still running; its slot is free once it finishes.
+        if slot is not None:
+            self._free_slots.append(slot)
+
+    def _prefetched_batch(self, index):
+        if self._executor is None:
+            self._start_workers()
+        if self._held_slot is not None:
+            self._free_slots.append(self._held_slot)
+            self._held_slot = None
+        for i in [i for i in self._pending if i < index]:
+            self._drop(i)
+        if index not in self._pending:
+            if self._ring is not None and not self._free_slots:
+                self._drop(max(self._pending))
+            self._submit(index)
+        # keep at most prefetch batches queued after this one.
+        for i in range(index + 1, min(index + self.prefetch + 1, len(self))):
+            if i in self._pending or (self.batch_lru is not None and i in self.batch_lru):
+                continue
+            if self._ring is None or self._free_slots:
+                self._submit(i)
+
+        future, slot = self._pending.pop(index)
+        if slot is None:
+            return future.result()
+        n = future.result()
+        self._held_slot = slot
+        return self._ring.X[slot, :n], self._ring.y[slot, :n]
 
     def _batch_generator(self, indexes):
         """Generates data containing batch_size samples"""
-        # Initialization
-        X = np.empty(self.in_batch_shape)
-        y = np.empty(self.out_batch_shape, dtype=int)
+        return _generate_batch(self.msig, indexes, self.stream, self.sample_epoch, self.in_batch_shape,
+                               self.out_batch_shape, self.dtype, self.label_dtype, self.inout_shape_code)
+
 
-        # Generate data
-        for i, _ in enumerate(indexes):
-            X[i], y[i] = self.generate(sequence_code=self.inout_shape_code)
+class StatefulSignalGenerator(Sequence):
+    """
+    Batches for stateful RNNs: row i of batch k + 1 continues row i of batch k.
+
+    Each of the batch_size rows is its own continuous recording (see MixedSignal.stream), from its own copy of msig
+    seeded by (stream, epoch, row).  Batches are cut lazily into consecutive segments of segment_length timestamps,
+    so a step only generates the blocks needed for one segment.  Batches must be requested in order
+    (keras does this with shuffle=False); on_epoch_end starts new recordings, so reset the RNN states then too.
+
+    X.shape == (batch_size, segment_length, n_features)
+    y.shape == (batch_size, segment_length, n_classes)
+    """
+
+    def __init__(self, msig, batch_size, segment_length, n_segments, stream=None):
+        self.msig = msig
+        # like SignalGenerator.stream; the rows are keyed apart from the generate_at samples either way.
+        self.stream = msig.new_stream_id() if stream is None else stream
+        self.batch_size = batch_size
+        self.segment_length = segment_length
+        self.n_segments = n_segments
+        self.dtype = msig.dtype
+        self.one_hot_dtype = msig.one_hot_dtype
+        self.epoch = 0
+        self._start_epoch()
+
+    def __len__(self):
+        return self.n_segments
+
+    def _start_epoch(self):
+        self._streams = []
+        for row in range(self.batch_size):
+            msig = copy.deepcopy(self.msig)
+            msig.reseed(self.msig.seed_sequence(STATEFUL_KEY, self.stream, self.epoch, row))
+            self._streams.append(msig.stream())
+        # per row, the blocks generated but not yet handed out, and how far into the first one we are.
+        self._buffers = [[] for _ in range(self.batch_size)]
+        self._offsets = [0] * self.batch_size
+        self._next_index = 0
+        self._last_batch = None
+
+    def _take(self, row, out_X, out_labels):
+        filled = 0
+        buffer = self._buffers[row]
+        while filled < self.segment_length:
+            if not buffer:
+                _, labels, inputs = next(self._streams[row])
+                buffer.append((labels, inputs))
+                self._offsets[row] = 0
+            labels, inputs = buffer[0]
+            start = self._offsets[row]
+            n = min(self.segment_length - filled, len(labels) - start)
+            out_X[filled:filled + n] = inputs[start:start + n]
+            out_labels[filled:filled + n] = labels[start:start + n]
+            filled += n
+            if start + n == len(labels):
+                buffer.pop(0)
+            else:
+                self._offsets[row] = start + n
+
+    def __getitem__(self, index):
+        if index == self._next_index - 1 and self._last_batch is not None:
+            return self._last_batch
+        if index != self._next_index:
+            raise IndexError(f'stateful batches must be requested in order; expected {self._next_index}, got {index}')
+        X = np.empty((self.batch_size, self.segment_length, self.msig.n_features), dtype=self.dtype)
+        labels = np.empty((self.batch_size, self.segment_length), dtype=int)
+        for row in range(self.batch_size):
+            self._take(row, X[row], labels[row])
+        y = one_hot_encode(labels.ravel(), self.msig.n_classes, dtype=self.one_hot_dtype)
+        y = y.reshape(self.batch_size, self.segment_length, self.msig.n_classes)
+        self._next_index += 1
+        self._last_batch = X, y
         return X, y
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        self._start_epoch()
+
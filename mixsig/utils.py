@@ -55,31 +55,61 @@ def shape2string(shp, seq_chars):
     return s
 
 
-def name_generator() -> Text:
+def spawn_generators(seed=None, n=1, bit_generator='PCG64'):
+    """
+    Create n statistically independent random number generators from a single seed.
+
+    :param seed: None, an int or a np.random.SeedSequence.
+    :param n: number of generators to spawn.
+    :param bit_generator: name of a numpy bit generator, e.g. 'PCG64' or 'Philox'.
+    :return: list of np.random.Generator
+    """
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    bit_generator = getattr(np.random, bit_generator)
+    return [np.random.Generator(bit_generator(child)) for child in seed_seq.spawn(n)]
+
+
+def rebuild(cls, args, kwargs, rng_states):
+    """
+    Unpickle an object from its constructor arguments, then restore the state of its random generators
+    (cls._generators()), so it carries on with the same random streams as the pickled original.
+    """
+    obj = cls(*args, **kwargs)
+    for rng, state in zip(obj._generators(), rng_states):
+        rng.bit_generator.state = state
+    return obj
+
+
+def name_generator(rng=None) -> Text:
+    rng = np.random.default_rng(rng)
     alphabet = np.array(list(string.ascii_uppercase))
-    return ''.join(alphabet[np.random.randint(0, len(alphabet), 3)])
+    return ''.join(alphabet[rng.integers(0, len(alphabet), 3)])
 
 
-def color_generator() -> Text:
-    r, g, b = np.random.randint(0, 255, 3)
+def color_generator(rng=None) -> Text:
+    rng = np.random.default_rng(rng)
+    r, g, b = rng.integers(0, 255, 3)
     return '#%02X%02X%02X' % (r, g, b)
 
 
-def uniform_noise_generator(mu=0, delta=0.5):
+def uniform_noise_generator(mu=0, delta=0.5, rng=None):
+    rng = np.random.default_rng(rng)
     lo, hi = mu - delta, mu + delta
 
     def gen_noise(n_timestamps):
-        return np.random.uniform(lo, hi, (n_timestamps,))
+        return rng.uniform(lo, hi, n_timestamps)
     return gen_noise
 
 
-def normal_noise_generator(mu=0, sigma=0.01):
+def normal_noise_generator(mu=0, sigma=0.01, rng=None):
+    rng = np.random.default_rng(rng)
+
     def gen_noise(n_timestamps):
-        return np.random.normal(mu, sigma, (n_timestamps,))
+        return rng.normal(mu, sigma, n_timestamps)
     return gen_noise
 
 
-def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise_type=None, **kwargs):
+def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise_type=None, rng=None, **kwargs):
     """
     If self.delta == 0 and self.dt == 1
     the time spacing will look like...
@@ -112,10 +142,11 @@ def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise
     noise_type = noise_type or ''
     assert noise_type.lower() in ('pareto', 'large', 'jitter', 'small', '')
     endpoint = kwargs.get('endpoint', False)
+    rng = np.random.default_rng(rng)
 
     if n_min != n_max:
         def gen_n_timestamps():
-            return np.random.randint(n_min, n_max + 1)
+            return rng.integers(n_min, n_max + 1)
     else:
         def gen_n_timestamps():
             return n_max
@@ -127,7 +158,7 @@ def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise
         assert pareto_shape is not None and pareto_shape > 0, ValueError('shape should be greater than 0.')
 
         def gen_timesequence():
-            times = np.cumsum(np.random.pareto(pareto_shape, size=gen_n_timestamps()))
+            times = np.cumsum(rng.pareto(pareto_shape, size=gen_n_timestamps()))
             slope = (t_max - t_min) / (times[-1] - times[0])
             intercept = t_max - slope * times[-1]
             return slope * times + intercept
@@ -143,7 +174,7 @@ def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise
                 n_timestamps = gen_n_timestamps()
                 uniform_timestamps = np.linspace(t_min, t_max, n_timestamps, endpoint=endpoint)
                 dt = (t_max - t_min) / (n_timestamps - 1)
-                noise = (dt / 2.0) * delta * (2.0 * np.random.uniform(size=n_timestamps) - 1)
+                noise = (dt / 2.0) * delta * (2.0 * rng.uniform(size=n_timestamps) - 1)
                 return uniform_timestamps + noise
         else:
             n_timestamps = gen_n_timestamps()
@@ -151,7 +182,7 @@ def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise
             dt = (t_max - t_min) / (n_timestamps - 1)
 
             def gen_timesequence():
-                noise = (dt / 2.0) * delta * (2.0 * np.random.uniform(size=n_timestamps) - 1)
+                noise = (dt / 2.0) * delta * (2.0 * rng.uniform(size=n_timestamps) - 1)
                 return uniform_timestamps + noise
 
     else:
@@ -171,13 +202,14 @@ def timesequence_generator(t_min=None, t_max=None, n_max=None, n_min=None, noise
     return gen_timesequence
 
 
-def create_label_distribution(n_timestamps, n_classes):
+def create_label_distribution(n_timestamps, n_classes, rng=None):
     """
     Create a distribution of ints which represent class labels.
     :return np.array([2,1,3, ... ,1])
     """
+    rng = np.random.default_rng(rng)
     shuffled_indexes = np.arange(n_timestamps)
-    np.random.shuffle(shuffled_indexes)
+    rng.shuffle(shuffled_indexes)
     labels = np.zeros(n_timestamps, dtype=int)
     for c in range(n_classes):
         labels[np.where(shuffled_indexes < c * n_timestamps // n_classes)] += 1
@@ -196,18 +228,81 @@ def create_one_hots_from_labels(labels, n_classes):
 
 
 # generate a sequence of random numbers in [0, n_classes)
-def generate_labels(length, n_classes, labels=None):
+def generate_labels(length, n_classes, labels=None, rng=None):
+    rng = np.random.default_rng(rng)
     if labels is None:
-        return np.random.randint(0, n_classes, length)
+        return rng.integers(0, n_classes, length)
     else:
         assert n_classes == len(labels)
-        seq = np.random.randint(0, n_classes, length)
+        seq = rng.integers(0, n_classes, length)
         return labels[seq]
 
 
+def merge_sorted_blocks(blocks, skip=0):
+    """
+    Merge blocks of rows, each (usually) sorted by time, into one time-sorted set of arrays.
+
+    Only the timestamps are concatenated.  numpy's stable sort (timsort) finds the sorted runs, so their argsort
+    is a linear-time k-way merge rather than a full sort.  Every block is then scattered straight into its
+    final rows, without concatenating (or gathering) the other arrays.
+    Ties keep the order of the blocks.  A single sorted block is returned as a view of it.
+    Blocks that are not sorted (e.g. jittered timestamps can swap neighbours) still merge correctly.
+
+    :param blocks: list of (timestamps, *arrays), the arrays having one row per timestamp.
+    :param skip: drop the first skip rows of the merged result.
+    :return: list [timestamps, *arrays]
+    """
+    if not blocks:
+        raise ValueError('need at least one block to merge')
+    if len(blocks) == 1 and np.all(blocks[0][0][1:] >= blocks[0][0][:-1]):
+        return [a[skip:] for a in blocks[0]]
+
+    timestamps = np.concatenate([block[0] for block in blocks])
+    order = np.argsort(timestamps, kind='stable')
+    n = len(timestamps) - skip
+    # destination row of every row of the concatenation.
+    dest = np.empty(len(order), dtype=np.intp)
+    dest[order] = np.arange(-skip, n)
+
+    outs = [timestamps[order[skip:]]]
+    outs += [np.empty((n,) + a.shape[1:], dtype=a.dtype) for a in blocks[0][1:]]
+    # the rows of the concatenation that are skipped.  In a sorted block they are a prefix of the block,
+    # but not necessarily in an unsorted one, so fall back to a mask there.
+    skipped = np.sort(order[:skip])
+    start = 0
+    for block in blocks:
+        stop = start + len(block[0])
+        pos = dest[start:stop]
+        drop = skipped[(skipped >= start) & (skipped < stop)] - start
+        if len(drop) == 0 or drop[-1] == len(drop) - 1:
+            keep = slice(len(drop), None)
+        else:
+            keep = np.ones(len(pos), dtype=bool)
+            keep[drop] = False
+        for out, a in zip(outs[1:], block[1:]):
+            out[pos[keep]] = a[keep]
+        start = stop
+    return outs
+
+
 # one hot encode sequence
-def one_hot_encode(sequence, n_classes):
-    return np.identity(n_classes)[sequence]
+def one_hot_encode(sequence, n_classes, dtype=float):
+    return np.identity(n_classes, dtype=dtype)[sequence]
+
+
+def sliding_windows(a, window_size, copy=True):
+    """
+    All windows of window_size consecutive rows of a.
+
+    :param a: array with shape (n_timestamps, ...)
+    :param copy: if False, return a read-only strided view of a (no memory is allocated),
+    else a new contiguous array.
+    :return: array with shape (n_timestamps - window_size + 1, window_size, ...)
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(a, window_size, axis=0)
+    # sliding_window_view appends the window axis; move it next to the sample axis.
+    windows = np.moveaxis(windows, -1, 1)
+    return np.ascontiguousarray(windows) if copy else windows
 
 
 # decode a one hot encoded sequence
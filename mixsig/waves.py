@@ -1,8 +1,10 @@
+import copy
 import numbers
 from collections import namedtuple
 from functools import total_ordering
 from math import isclose
 import numpy as np
+from .kernels import get_kernel
 from .utils import name_generator
 from .utils import color_generator
 from .utils import normal_noise_generator
@@ -10,19 +12,104 @@ from .utils import uniform_noise_generator
 from .utils import timesequence_generator
 from .utils import create_one_hots_from_labels
 from .utils import generate_labels
+from .utils import rebuild
 
 WaveProps = namedtuple('WaveProps', 'a w o p')
 
+# derivative order of x(t) = a * f(w * t - p) + o for each feature name. None -> raw timestamps.
+FEATURE_ORDERS = {
+    'x': 0,
+    'd0xdt0': 0,
+    'dxdt': 1,
+    'd1xdt1': 1,
+    'd2xdt2': 2,
+    'd3xdt3': 3,
+    'time': None,
+}
+
+
+def compile_feature_plan(features):
+    """
+    Compile a tuple of feature names into a plan of (column, order) pairs.
+
+    :param features: feature names, e.g. ('x', 'dxdt', 'time')
+    :return: tuple of (column, order) where order is the derivative order or None for 'time'.
+    """
+    plan = []
+    for i, feat in enumerate(features):
+        if feat not in FEATURE_ORDERS:
+            raise ValueError(f'Unknown feature {feat}')
+        plan.append((i, FEATURE_ORDERS[feat]))
+    return tuple(plan)
+
+
+def evaluate_feature_plan(plan, timestamps, wp, noise, out, kernel=None, cache=None):
+    """
+    Evaluate a compiled feature plan into the columns of out.
+
+    The kernel returns each requested derivative as a (base, factor) pair, so that
+    d^k/dt^k x = a * factor * base, (plus o + noise for k = 0)
+    which is written directly into out[..., column].  For the default sine kernel
+    the phase argument w * t - p is computed once, followed by at most one sin and one cos,
+    and every derivative is a scaled copy of one of those two arrays.  All arguments broadcast,
+    so the same plan serves a single wave (t,) and a batch of waves (b, t).
+
+    :param plan: output of compile_feature_plan
+    :param timestamps: array of timestamps
+    :param wp: WaveProps of scalars or arrays broadcastable against timestamps
+    :param noise: additive noise for the order 0 feature (scalar or array)
+    :param out: preallocated array with shape (..., n_features)
+    :param kernel: a Kernel instance (default: sine)
+    :param cache: optional dict the kernel may use to reuse work between calls with the same timestamps.
+    :return: out
+    """
+    a, w, o, p = wp
+    kernel = kernel or get_kernel()
+    orders = sorted({order for _, order in plan if order is not None})
+    # the intermediate arrays share the dtype of out, so a float32 out means float32 trig
+    # (of a phase computed in float64, see kernels.cast_phase).
+    bases = kernel.derivatives(timestamps, w, p, orders, dtype=out.dtype, cache=cache) if orders else {}
+
+    has_noise = not (np.isscalar(noise) and noise == 0)
+    for col, order in plan:
+        column = out[..., col]
+        if order is None:
+            column[...] = timestamps
+            continue
+        base, factor = bases[order]
+        np.multiply(base, a * factor, out=column)
+        if order == 0:
+            column += o
+            if has_noise:
+                column += noise
+    return out
+
 
 @total_ordering
 class WaveProperty:
 
-    def __init__(self, mean=None, delta=None):
+    distributions = ('uniform', 'normal', 'loguniform', 'choice')
+
+    def __init__(self, mean=None, delta=None, distribution=None, values=None, rng=None):
+        self.rng = np.random.default_rng(rng)
         self.mean = 0.0 if mean is None else float(mean)
         self.delta = 0.0 if delta is None else float(delta)
-
-        if isclose(self.delta, 0, abs_tol=1e-9):
-            self.generate = lambda: self.mean
+        self.distribution = (distribution or 'uniform').lower()
+        self.values = None if values is None else np.array(values, dtype=float)
+
+        if self.distribution not in self.distributions:
+            raise ValueError(f'Unknown distribution {distribution}. Use one of {self.distributions}')
+
+        if self.distribution == 'choice':
+            if self.values is None or len(self.values) == 0:
+                raise ValueError('The choice distribution requires a non-empty list of values.')
+            self.generate = self._choice_generator(self.values)
+        elif isclose(self.delta, 0, abs_tol=1e-9):
+            self.generate = self._constant_generator(self.mean)
+        elif self.distribution == 'normal':
+            self.generate = self._normal_generator(self.mean, self.delta)
+        elif self.distribution == 'loguniform':
+            self.generate = self._loguniform_generator(self.mean, self.delta)
         else:
             self.generate = self._generator(self.mean, self.delta)
 
@@ -32,23 +119,71 @@ class WaveProperty:
         self.value = self.generate()
         return self.value
 
+    def __reduce__(self):
+        kwargs = {'mean': self.mean, 'delta': self.delta, 'distribution': self.distribution,
+                  'values': self.values, 'rng': self.rng}
+        return rebuild, (self.__class__, (), kwargs, [self.rng.bit_generator.state])
+
+    def _generators(self):
+        return [self.rng]
+
+    @property
+    def is_constant(self):
+        """True if every draw gives the same value (before any mixed wave scaling)."""
+        return self.distribution != 'choice' and isclose(self.delta, 0, abs_tol=1e-9)
+
+    def sample(self, n, **kwargs) -> np.ndarray:
+        """
+        Draw n values at once.  Unlike __call__, self.value is left untouched.
+
+        :param n: number of draws (an int or a shape tuple).
+        :return: an ndarray of shape n
+        """
+        return self.generate(n)
+
+    @staticmethod
+    def _constant_generator(mean):
+        def inner(size=None):
+            return mean if size is None else np.full(size, mean)
+        return inner
+
     def _generator(self, mean, delta):
         """
-        np.random.uniform(mean - delta, mean + delta) ==
-        mean + (2 * np.random.random() - 1) * delta ==
+        rng.uniform(mean - delta, mean + delta) ==
+        mean + (2 * rng.random() - 1) * delta ==
         a x + b, where a = 2.0 * delta and b = mean - delta
 
         :param mean: midpoint of a uniform distribution
         :param delta: allowable distance from the mean from which to sample.
-        :return: a closure
+        :return: a closure.  Called with no args it returns a float, called with size it returns an ndarray.
         """
         # a = 2.0 * delta
         # b = mean - delta
         lo, hi = mean - delta, mean + delta
 
-        def inner():
-            # return a * np.random.random() + b
-            return np.random.uniform(lo, hi)
+        def inner(size=None):
+            # return a * self.rng.random() + b
+            return self.rng.uniform(lo, hi, size)
+        return inner
+
+    def _normal_generator(self, mean, sigma):
+        def inner(size=None):
+            return self.rng.normal(mean, sigma, size)
+        return inner
+
+    def _loguniform_generator(self, mean, delta):
+        lo, hi = mean - delta, mean + delta
+        if lo <= 0:
+            raise ValueError('loguniform requires mean - delta > 0')
+        log_lo, log_hi = np.log(lo), np.log(hi)
+
+        def inner(size=None):
+            return np.exp(self.rng.uniform(log_lo, log_hi, size))
+        return inner
+
+    def _choice_generator(self, values):
+        def inner(size=None):
+            return self.rng.choice(values, size)
         return inner
 
     def __repr__(self):
@@ -82,25 +217,31 @@ class WaveProperty:
 
 class Amplitude(WaveProperty):
 
-    def __init__(self, mean=None, delta=None):
+    def __init__(self, mean=None, delta=None, **kwargs):
         mean = 1.0 if mean is None else float(mean)
-        super().__init__(mean, delta)
+        super().__init__(mean, delta, **kwargs)
 
     def __call__(self, amplitude=1, **kwargs) -> float:
         self.value = self.generate()
         return self.value * amplitude
 
+    def sample(self, n, amplitude=1, **kwargs) -> np.ndarray:
+        return self.generate(n) * amplitude
+
 
 class Frequency(WaveProperty):
 
-    def __init__(self, mean=None, delta=None):
+    def __init__(self, mean=None, delta=None, **kwargs):
         mean = 1.0 if mean is None else float(mean)
-        super().__init__(mean, delta)
+        super().__init__(mean, delta, **kwargs)
 
     def __call__(self, frequency=1, **kwargs) -> float:
         self.value = self.generate()
         return self.value * frequency
 
+    def sample(self, n, frequency=1, **kwargs) -> np.ndarray:
+        return self.generate(n) * frequency
+
 
 class Offset(WaveProperty):
 
@@ -108,18 +249,24 @@ class Offset(WaveProperty):
         self.value = self.generate()
         return self.value + offset
 
+    def sample(self, n, offset=0, **kwargs) -> np.ndarray:
+        return self.generate(n) + offset
+
 
 class Phase(WaveProperty):
 
     def _generator(self, mean, delta):
-        def inner():
-            return np.random.random()  # later on this will be scaled by 2*pi
+        def inner(size=None):
+            return self.rng.random(size)  # later on this will be scaled by 2*pi
         return inner
 
     def __call__(self, phase=0, **kwargs) -> float:
         self.value = self.generate()
         return self.value + phase
 
+    def sample(self, n, phase=0, **kwargs) -> np.ndarray:
+        return self.generate(n) + phase
+
 
 class Wave:
     def __init__(self,
@@ -131,75 +278,218 @@ class Wave:
                  offset=None,
                  phase=None,
                  noise=None,
+                 kernel=None,
                  color=None,
-                 name=None):
+                 name=None,
+                 rng=None,
+                 dtype=None,
+                 label_dtype=None):
+
+        # dtype of the generated inputs and labels.
+        self.dtype = np.dtype(dtype or np.float64)
+        self.label_dtype = np.dtype(label_dtype or int)
+
+        # All random draws of this wave (properties, noise, timestamps) go through self.rng.
+        self.rng = np.random.default_rng(rng)
+
+        # Waves are pickled as their constructor arguments plus the state of self.rng (see __reduce__).
+        self._init_kwargs = {
+            'time': time, 'label': label, 'amplitude': amplitude, 'frequency': frequency, 'offset': offset,
+            'phase': phase, 'noise': noise, 'dtype': dtype, 'label_dtype': label_dtype}
 
         # self.timestamps = None
 
-        self._timestamp_generator = timesequence_generator(**time) if time is not None else lambda: None
-        # self.is_independent = time is not None
+        if time is not None:
+            self._timestamp_generator = timesequence_generator(**time, rng=self.rng)
+        else:
+            self._timestamp_generator = lambda: None
+        self.is_independent = time is not None
 
         amplitude = amplitude or {}
-        self.amplitude = Amplitude(**amplitude)
+        self.amplitude = Amplitude(**amplitude, rng=self.rng)
 
         frequency = frequency or {}
-        self.frequency = Frequency(**frequency)
+        self.frequency = Frequency(**frequency, rng=self.rng)
 
         offset = offset or {}
-        self.offset = Offset(**offset)
+        self.offset = Offset(**offset, rng=self.rng)
 
         phase = phase or {}
-        self.phase = Phase(**phase)
+        self.phase = Phase(**phase, rng=self.rng)
 
         self.noise = None
         noise = noise or {}
-        if 'uniform' in noise:
-            self._noise_generator = uniform_noise_generator(**noise['uniform'])
-        elif 'normal' in noise:
-            self._noise_generator = normal_noise_generator(**noise['normal'])
-        else:
-            self._noise_generator = lambda *args, **kwargs: 0
+        self.noise_coeffs = noise
+        self._noise_generator = self._make_noise_generator(self.rng)
+
+        # waveform shape, e.g. 'sine' (default), 'square' or {'name': 'damped_sine', 'damping': 0.5}
+        self.kernel = get_kernel(kernel)
 
-        self.color = color or color_generator()
-        self.name = name or name_generator()
+        self.color = color or color_generator(self.rng)
+        self.name = name or name_generator(self.rng)
 
         self.features = features or ('x',)
+        self._feature_plan = None
         self._timestamps = None
         self._n_timestamps = None
         self._wp = None
         self.indices = None
+        self._noise_full = None
+        self._timestamps_sparse = None
         self._sample = None
+        self._sample_full = None
         self._labels = None
+        self._labels_sparse = None
         self._inputs = None
+        self._inputs_full = None
+        # sin(w t) and cos(w t) can only be reused between calls if neither w nor the timestamps ever change
+        # (see SineKernel._shifted_sincos).  Otherwise every call would miss, so don't pass the kernel a cache.
+        fixed_time = (time is not None and not time.get('noise_type')
+                      and time.get('n_min') in (None, time.get('n_max', time.get('n_timestamps'))))
+        self._trig_cache = {} if fixed_time and self.frequency.is_constant else None
         self._label = label
 
+    def __reduce__(self):
+        """
+        Pickle a wave as its configuration and the state of its random generator.
+        Generated data is not pickled; call generate() again on the copy.
+        """
+        kwargs = {**self._init_kwargs, 'kernel': self.kernel.config, 'color': self.color, 'name': self.name,
+                  'rng': self.rng}
+        return rebuild, (self.__class__, self.features, kwargs, [self.rng.bit_generator.state])
+
+    def _generators(self):
+        return [self.rng]
+
+    def _make_noise_generator(self, rng):
+        if 'uniform' in self.noise_coeffs:
+            return uniform_noise_generator(**self.noise_coeffs['uniform'], rng=rng)
+        if 'normal' in self.noise_coeffs:
+            return normal_noise_generator(**self.noise_coeffs['normal'], rng=rng)
+        return lambda *args, **kwargs: 0
+
     def generate(self, ts=None, indices=None, **kwargs):
+        """
+        Draw new wave properties and noise.
+
+        If indices is given, the wave only owns the timestamps ts[indices] (e.g. its share of a mixed wave)
+        and timestamps, noise, sample, labels and inputs are evaluated at those points only.
+        The *_full properties are still available, but are evaluated lazily over the whole of ts.
+        """
+
+        previous = (self._timestamps, self.indices, self._wp)
+
+        self._next_timestamps(ts, indices)
+        a = self.amplitude(**kwargs)
+        w = self.frequency(**kwargs) * 2.0 * np.pi
+        o = self.offset(**kwargs)
+        p = self.phase(**kwargs) * 2.0 * np.pi
+        self._wp = WaveProps(a, w, o, p)
+
+        if self._is_repeat(*previous):
+            # Same timestamps, same properties and no noise; the arrays from the last call are still valid.
+            return
+
+        self._clear()
+
+    def advance(self, t_shift, ts=None, indices=None):
+        """
+        Move on to the next block of a long recording: draw new timestamps and noise, but keep the wave properties.
+
+        :param t_shift: added to the timestamps of an independent wave, e.g. k * (t_max - t_min) for block k,
+        so consecutive blocks join up into one continuous wave.  A dependent wave uses ts as given.
+        """
+        self._next_timestamps(ts, indices, t_shift=t_shift)
+        self._clear()
 
+    def _next_timestamps(self, ts, indices, t_shift=0.0):
         # self.timestamps = self._timestamp_generator() if self.is_independent else ts
         self._timestamps = self._timestamp_generator()
         if self._timestamps is None:
             self._timestamps = ts
+        elif t_shift:
+            self._timestamps = self._timestamps + t_shift
 
-        if self.n_timestamps != len(self.timestamps):
+        if self._n_timestamps != len(self._timestamps):
             self._n_timestamps = None
             self._labels = None
 
         self.indices = indices
-        self.noise = self._noise_generator(self.n_timestamps)
-        a = self.amplitude(**kwargs)
-        w = self.frequency(**kwargs) * 2.0 * np.pi
-        o = self.offset(**kwargs)
-        p = self.phase(**kwargs) * 2.0 * np.pi
-        self._wp = WaveProps(a, w, o, p)
+        self.noise = self._noise_generator(len(self))
+
+    def _clear(self):
+        self._timestamps_sparse = None
+        self._labels_sparse = None
+        self._noise_full = None
         self._sample = None
+        self._sample_full = None
         self._inputs = None
+        self._inputs_full = None
+
+    def _is_repeat(self, timestamps, indices, wp):
+        """True if the last generate call produced exactly the same wave as this one."""
+        return (not self.noise_coeffs
+                and self._timestamps is timestamps
+                and self.indices is indices
+                and self._wp == wp)
+
+    def generate_batch(self, batch_size, ts=None, **kwargs):
+        """
+        Generate batch_size independent realizations of this wave in one vectorized pass.
+
+        Each realization gets its own draw of WaveProps(a, w, o, p) and its own noise.
+        The properties are evaluated as (batch_size, 1) columns and broadcast against
+        the (batch_size, n_timestamps) (or (1, n_timestamps)) grid of timestamps.
+
+        :param batch_size: number of realizations to generate.
+        :param ts: timestamps to use if this wave does not have its own time sequence.
+        :return: inputs with shape (batch_size, n_timestamps, n_features),
+                 labels with shape (batch_size, n_timestamps)
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be >= 1')
+
+        timestamps = self._batch_timestamps(batch_size, ts)
+        n_timestamps = timestamps.shape[-1]
+
+        a = self.amplitude.sample((batch_size, 1), **kwargs)
+        w = self.frequency.sample((batch_size, 1), **kwargs) * 2.0 * np.pi
+        o = self.offset.sample((batch_size, 1), **kwargs)
+        p = self.phase.sample((batch_size, 1), **kwargs) * 2.0 * np.pi
+        wp = WaveProps(a, w, o, p)
+        noise = self._noise_generator((batch_size, n_timestamps))
+
+        inputs = np.empty((batch_size, n_timestamps, len(self.features)), dtype=self.dtype)
+        evaluate_feature_plan(self.feature_plan, timestamps, wp, noise, inputs, kernel=self.kernel)
+        labels = np.full((batch_size, n_timestamps), self.label, dtype=self.label_dtype)
+        return inputs, labels
+
+    def _batch_timestamps(self, batch_size, ts=None):
+        """Stack the timestamps for a batch.  Shared time sequences are returned as a single (1, t) row."""
+        ts_batch = [self._timestamp_generator() for _ in range(batch_size)]
+        if ts_batch[0] is None:
+            if ts is None:
+                raise TypeError('Wave has no time sequence of its own; ts is required.')
+            return np.asarray(ts)[None, :]
+        if all(t is ts_batch[0] for t in ts_batch):
+            return ts_batch[0][None, :]
+        if len(set(len(t) for t in ts_batch)) != 1:
+            raise ValueError('generate_batch requires a fixed number of timestamps (n_min == n_max).')
+        return np.stack(ts_batch)
+
+    @property
+    def feature_plan(self):
+        if self._feature_plan is None:
+            self._feature_plan = compile_feature_plan(self.features)
+        return self._feature_plan
 
     @property
     def timestamps(self):
         if self.indices is None:
             return self.timestamps_full
-        else:
-            return self.timestamps_full[self.indices]
+        if self._timestamps_sparse is None:
+            self._timestamps_sparse = self.timestamps_full[self.indices]
+        return self._timestamps_sparse
 
     @property
     def timestamps_full(self):
@@ -218,32 +508,58 @@ class Wave:
         return self._n_timestamps
 
     def __len__(self):
-        return len(self.timestamps)
+        if self.indices is None:
+            return self.n_timestamps
+        return len(self.indices)
+
+    @property
+    def noise_full(self):
+        if self.indices is None or np.isscalar(self.noise):
+            return self.noise
+        if self._noise_full is None:
+            # keep the noise of the timestamps this wave owns and only draw noise for the others.
+            # Those draws come from a generator seeded off a copy of self.rng, so reading a *_full
+            # property (e.g. to plot it) doesn't change what the next generate() draws.
+            filler_rng = np.random.default_rng(copy.deepcopy(self.rng).integers(2 ** 63, size=4))
+            owned = np.zeros(self.n_timestamps, dtype=bool)
+            owned[self.indices] = True
+            self._noise_full = np.empty(self.n_timestamps, dtype=self.noise.dtype)
+            self._noise_full[~owned] = self._make_noise_generator(filler_rng)(self.n_timestamps - len(self.indices))
+            self._noise_full[self.indices] = self.noise
+        return self._noise_full
 
     @property
     def sample(self):
         if self.indices is None:
             return self.sample_full
-        else:
-            return self.sample_full[self.indices]
+        if self._sample is None:
+            self._sample = self._sample_from(self.inputs, self.timestamps, self.noise)
+        return self._sample
 
     @property
     def sample_full(self):
-        if self._sample is None:
-            self._sample = self.d0xdt0()
-        return self._sample
+        if self._sample_full is None:
+            self._sample_full = self._sample_from(self.inputs_full, self.timestamps_full, self.noise_full)
+        return self._sample_full
+
+    def _sample_from(self, inputs, timestamps, noise):
+        cols = [col for col, order in self.feature_plan if order == 0]
+        if cols:
+            return inputs[:, cols[0]]
+        return self._evaluate(((0, 0),), timestamps, noise)[:, 0]
 
     @property
     def labels(self):
         if self.indices is None:
             return self.labels_full
-        else:
-            return self.labels_full[self.indices]
+        if self._labels_sparse is None:
+            self._labels_sparse = np.full((len(self),), self.label, dtype=self.label_dtype)
+        return self._labels_sparse
 
     @property
     def labels_full(self):
         if self._labels is None:
-            self._labels = np.zeros((self.n_timestamps,), dtype=int) + self.label
+            self._labels = np.full((self.n_timestamps,), self.label, dtype=self.label_dtype)
         return self._labels
 
     @property
@@ -258,52 +574,179 @@ class Wave:
     def inputs(self):
         if self.indices is None:
             return self.inputs_full
-        else:
-            return self.inputs_full[self.indices]
+        if self._inputs is None:
+            self._inputs = self._evaluate(self.feature_plan, self.timestamps, self.noise)
+        return self._inputs
 
     @property
     def inputs_full(self):
-        if self._inputs is None:
-            self._inputs = np.zeros((self.n_timestamps, len(self.features)))
-            for i, feat in enumerate(self.features):
-                if feat in ('x', 'd0xdt0'):
-                    feature = self.d0xdt0()
-                elif feat in ('dxdt', 'd1xdt1'):
-                    feature = self.d1xdt1()
-                elif feat == 'd2xdt2':
-                    feature = self.d2xdt2()
-                elif feat == 'd3xdt3':
-                    feature = self.d3xdt3()
-                elif feat == 'time':
-                    feature = self.timestamps_full
-                else:
-                    raise ValueError(f'Unknown feature {feat}')
-                self._inputs[:, i] = feature
-        return self._inputs
+        if self._inputs_full is None:
+            self._inputs_full = self._evaluate(self.feature_plan, self.timestamps_full, self.noise_full)
+        return self._inputs_full
+
+    def _evaluate(self, plan, timestamps, noise):
+        out = np.empty((len(timestamps), len(plan)), dtype=self.dtype)
+        return evaluate_feature_plan(plan, timestamps, self._wp, noise, out, kernel=self.kernel, cache=self._trig_cache)
+
+    def _derivative(self, order):
+        return self._evaluate(((0, order),), self.timestamps_full, self.noise_full)[:, 0]
 
     def d0xdt0(self):
-        a, w, o, p = self._wp
-        return a * np.sin(w * self.timestamps_full - p) + o + self.noise
+        return self._derivative(0)
 
     def d1xdt1(self):
-        a, w, o, p = self._wp
-        return a * w * np.cos(w * self.timestamps_full - p)
+        return self._derivative(1)
 
     def d2xdt2(self):
-        a, w, o, p = self._wp
-        return -1 * a * w ** 2 * np.sin(w * self.timestamps_full - p)
+        return self._derivative(2)
 
     def d3xdt3(self):
-        a, w, o, p = self._wp
-        return -1 * a * w ** 3 * np.cos(w * self.timestamps_full - p)
+        return self._derivative(3)
 
     def __repr__(self):
+        if self.kernel.name != 'sine':
+            return (f'Wave(amplitude={self.amplitude}, frequency={self.frequency}, offset={self.offset}, '
+                    f'phase={self.phase}, kernel={self.kernel})')
         return f'Wave(amplitude={self.amplitude}, frequency={self.frequency}, offset={self.offset}, phase={self.phase})'
 
 
+class WaveBank:
+    """
+    Struct-of-arrays backend for a list of waves.
+
+    The means and deltas of every wave's amplitude, frequency, offset, phase and noise are stored as
+    contiguous arrays so that all classes can be drawn and evaluated in one vectorized pass,
+    instead of looping over the waves in Python.  Only the uniform (default) property distribution
+    and a single kernel shared by all the waves are supported; use WaveBank.supports to check a list
+    of waves.  The per-wave attributes (wave.sample, wave.inputs, ...) are not updated by
+    WaveBank.generate.
+    """
+
+    prop_names = ('amplitude', 'frequency', 'offset', 'phase')
+
+    def __init__(self, waves, rng=None, dtype=None, label_dtype=None):
+        if not self.supports(waves):
+            raise ValueError('WaveBank requires waves with uniform properties and identical features and kernels.')
+
+        self.rng = np.random.default_rng(rng)
+        self.dtype = np.dtype(dtype or np.float64)
+        self.label_dtype = np.dtype(label_dtype or int)
+        self.waves = waves
+        self.features = waves[0].features
+        self.feature_plan = compile_feature_plan(self.features)
+        self.kernel = waves[0].kernel
+        self.labels = np.array([wave.label for wave in waves], dtype=self.label_dtype)
+        self._label_order = np.argsort(self.labels)
+        self.is_independent = np.array([wave.is_independent for wave in waves])
+
+        # (n_waves, 4) arrays of the lower bound and width of each property's uniform distribution.
+        lo = np.zeros((len(waves), len(self.prop_names)))
+        width = np.zeros((len(waves), len(self.prop_names)))
+        for i, wave in enumerate(waves):
+            for j, prop_name in enumerate(self.prop_names):
+                prop = getattr(wave, prop_name)
+                if isclose(prop.delta, 0, abs_tol=1e-9):
+                    lo[i, j] = prop.mean
+                elif prop_name == 'phase':
+                    lo[i, j], width[i, j] = 0.0, 1.0
+                else:
+                    lo[i, j], width[i, j] = prop.mean - prop.delta, 2.0 * prop.delta
+        self.prop_lo = lo
+        self.prop_width = width
+
+        # noise = noise_loc + noise_scale * draw, where draw is U[0, 1) or N(0, 1).
+        self.noise_loc = np.zeros(len(waves))
+        self.noise_scale = np.zeros(len(waves))
+        self.noise_is_normal = np.zeros(len(waves), dtype=bool)
+        for i, wave in enumerate(waves):
+            if 'uniform' in wave.noise_coeffs:
+                mu = wave.noise_coeffs['uniform'].get('mu', 0)
+                delta = wave.noise_coeffs['uniform'].get('delta', 0.5)
+                self.noise_loc[i], self.noise_scale[i] = mu - delta, 2.0 * delta
+            elif 'normal' in wave.noise_coeffs:
+                self.noise_loc[i] = wave.noise_coeffs['normal'].get('mu', 0)
+                self.noise_scale[i] = wave.noise_coeffs['normal'].get('sigma', 0.01)
+                self.noise_is_normal[i] = True
+        self.has_noise = bool(np.any(self.noise_scale != 0) or np.any(self.noise_loc != 0))
+
+    @staticmethod
+    def supports(waves):
+        if len(waves) == 0:
+            return False
+        for wave in waves:
+            if wave.features != waves[0].features or wave.kernel != waves[0].kernel:
+                return False
+            for prop_name in WaveBank.prop_names:
+                if getattr(wave, prop_name).distribution != 'uniform':
+                    return False
+        return True
+
+    def draw_props(self, amplitude=1, frequency=1, offset=0, phase=0, **kwargs):
+        """
+        Draw one set of properties for every wave.
+        The mixed-wave kwargs are only applied to the waves without their own time sequence.
+
+        :return: WaveProps of (n_waves,) arrays, with w and p already scaled by 2 pi.
+        """
+        values = self.prop_lo + self.prop_width * self.rng.random(self.prop_lo.shape)
+        a, f, o, p = values.T
+        mixed = ~self.is_independent
+        a[mixed] *= amplitude
+        f[mixed] *= frequency
+        o[mixed] += offset
+        p[mixed] += phase
+        return WaveProps(a, f * 2.0 * np.pi, o, p * 2.0 * np.pi)
+
+    def generate(self, ts=None, labels=None, **kwargs):
+        """
+        Generate every wave in one vectorized pass.
+
+        :param ts: timestamps of the mixed wave (if any).
+        :param labels: class label of each timestamp of the mixed wave (if any).
+        :param kwargs: mixed wave properties.
+        :return: timestamps, labels and inputs.  The mixed-wave block comes first and is in the order of ts,
+                 followed by the timestamps of each independent wave.  self.block_sizes has the block lengths.
+        """
+        timestamps = []
+        rows = []
+        if ts is not None:
+            timestamps.append(ts)
+            rows.append(self._rows_from_labels(labels))
+        for i in np.flatnonzero(self.is_independent):
+            ts_i = self.waves[i]._timestamp_generator()
+            timestamps.append(ts_i)
+            rows.append(np.full(len(ts_i), i))
+
+        # lengths of the mixed block and of each independent wave in the concatenated output.
+        self.block_sizes = [len(ts_i) for ts_i in timestamps]
+        timestamps = np.concatenate(timestamps) if len(timestamps) > 1 else timestamps[0]
+        rows = np.concatenate(rows) if len(rows) > 1 else rows[0]
+
+        wp = self.draw_props(**kwargs)
+        wp_pt = WaveProps(*[prop[rows] for prop in wp])
+
+        noise = 0
+        if self.has_noise:
+            draws = np.empty(len(rows))
+            is_normal = self.noise_is_normal[rows]
+            n_normal = np.count_nonzero(is_normal)
+            draws[is_normal] = self.rng.standard_normal(n_normal)
+            draws[~is_normal] = self.rng.random(len(rows) - n_normal)
+            noise = self.noise_loc[rows] + self.noise_scale[rows] * draws
+
+        inputs = np.empty((len(timestamps), len(self.features)), dtype=self.dtype)
+        evaluate_feature_plan(self.feature_plan, timestamps, wp_pt, noise, inputs, kernel=self.kernel)
+        return timestamps, self.labels[rows], inputs
+
+    def _rows_from_labels(self, labels):
+        return self._label_order[np.searchsorted(self.labels, labels, sorter=self._label_order)]
+
+
 class MixedWave:
-    def __init__(self, classes=None, mwave_coeffs=None):
+    def __init__(self, classes=None, mwave_coeffs=None, rng=None):
 
+        self.rng = np.random.default_rng(rng)
+        self._init_kwargs = {'classes': classes, 'mwave_coeffs': mwave_coeffs}
         self.name = 'Mixed'
         self.signals = None
         self.classes = np.array(classes)
@@ -320,7 +763,7 @@ class MixedWave:
         self._label = None
 
         if 'time' in mwave_coeffs:
-            self.timestamp_generator = timesequence_generator(**mwave_coeffs['time'])
+            self.timestamp_generator = timesequence_generator(**mwave_coeffs['time'], rng=self.rng)
 
         mixed_wave_prop_defaults = {
             'amplitude': {'mean': 1, 'delta': 0},
@@ -332,13 +775,20 @@ class MixedWave:
         for prop_name, default_coeffs in mixed_wave_prop_defaults.items():
             coeffs = mwave_coeffs[prop_name] if prop_name in mwave_coeffs else default_coeffs
             if prop_name == 'amplitude':
-                self.mixed_wave_props[prop_name] = Amplitude(**coeffs)
+                self.mixed_wave_props[prop_name] = Amplitude(**coeffs, rng=self.rng)
             elif prop_name == 'frequency':
-                self.mixed_wave_props[prop_name] = Frequency(**coeffs)
+                self.mixed_wave_props[prop_name] = Frequency(**coeffs, rng=self.rng)
             elif prop_name == 'offset':
-                self.mixed_wave_props[prop_name] = Offset(**coeffs)
+                self.mixed_wave_props[prop_name] = Offset(**coeffs, rng=self.rng)
             elif prop_name == 'phase':
-                self.mixed_wave_props[prop_name] = Phase(**coeffs)
+                self.mixed_wave_props[prop_name] = Phase(**coeffs, rng=self.rng)
+
+    def __reduce__(self):
+        kwargs = {**self._init_kwargs, 'rng': self.rng}
+        return rebuild, (self.__class__, (), kwargs, [self.rng.bit_generator.state])
+
+    def _generators(self):
+        return [self.rng]
 
     def generate(self):
         """ Generate waves from property values."""
@@ -355,7 +805,7 @@ class MixedWave:
 
         # create a uniform distribution of class labels -> np.array([2,1,3, ... ,1])
         # (500,), (t,), (n_timestamps,)
-        self.labels = generate_labels(len(self.timestamps), self.n_classes, labels=self.classes)
+        self.labels = generate_labels(len(self.timestamps), self.n_classes, labels=self.classes, rng=self.rng)
 
         # create one-hots from labels -> np.array([[0,0,1,0], [0,1,0,0], [0,0,0,1], ... ,[0,1,0,0]])
         # (500, 4), (t, c), (n_timestamps, n_classes)
@@ -373,6 +823,11 @@ class MixedWave:
         # (500, 2), (t, f), (n_timestamps, n_features)
         # self.inputs = np.sum(self.one_hots.T[..., None] * self.wave_inputs, axis=0)
 
+    def advance(self, t_shift):
+        """Next block of a long recording: new timestamps (shifted by t_shift) and labels, same properties."""
+        self.timestamps = self.timestamp_generator() + t_shift
+        self.labels = generate_labels(len(self.timestamps), self.n_classes, labels=self.classes, rng=self.rng)
+
     @property
     def sample(self):
         if self._sample is None:
@@ -35,7 +35,8 @@ def setup_package():
         description=DESCRIPTION,
         long_description='',
         setup_requires=['pytest-runner'],
-        install_requires=['numpy'],
+        python_requires='>=3.9',
+        install_requires=['numpy>=1.20'],
         extras_require={
             'all': [
                 'pandas',
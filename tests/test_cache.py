@@ -0,0 +1,112 @@
+import os
+import numpy as np
+from mixsig.cache import BatchLRU
+from mixsig.cache import DatasetCache
+from mixsig.cache import config_hash
+from mixsig.mixed import MixedSignal
+from mixsig.mixed import SignalGenerator
+
+
+def make_signal(run_label='test', seed=3, sigma=0.1):
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'noise': {'normal': {'mu': 0, 'sigma': sigma}}}
+                    for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', run_label=run_label, seed=seed)
+    msig.generate()
+    return msig
+
+
+def test_config_hash():
+    key = config_hash(make_signal(), 10)
+    assert key == config_hash(make_signal(run_label='other'), 10)
+    assert key != config_hash(make_signal(seed=4), 10)
+    assert key != config_hash(make_signal(sigma=0.2), 10)
+    assert key != config_hash(make_signal(), 11)
+    assert key != config_hash(make_signal(), 10, epoch=1)
+    assert key != config_hash(make_signal(), 10, stream=1)
+    assert config_hash(make_signal(seed=None), 10) != config_hash(make_signal(seed=None), 10)
+
+
+def test_dataset_cache(tmpdir):
+    msig = make_signal()
+    cache = DatasetCache(msig, 10, shard_size=4, cache_dir=str(tmpdir))
+    assert not cache.is_complete
+    cache.build()
+    assert cache.is_complete and cache.n_shards == 3
+    assert sorted(os.listdir(cache.cache_dir)) == [f'{c}_{k:05d}.npy' for c in 'Xy' for k in range(3)]
+
+    X, y = cache[[9, 0, 5, 4]]
+    for i, sample_id in enumerate([9, 0, 5, 4]):
+        Xi, yi = msig.generate_at(sample_id)
+        assert np.array_equal(X[i], Xi) and np.array_equal(y[i], yi)
+    X, y = cache[7]
+    assert np.array_equal(X, msig.generate_at(7)[0])
+
+    # a second run with the same config reads the shards instead of generating them.
+    cache = DatasetCache(make_signal(run_label='again'), 10, shard_size=4, cache_dir=str(tmpdir))
+    assert cache.is_complete
+    cache.msig = None
+    assert np.array_equal(cache[[5]][0][0], msig.generate_at(5)[0])
+
+
+def test_dataset_cache_default_dir(tmpdir):
+    cwd = os.getcwd()
+    os.chdir(str(tmpdir))
+    try:
+        cache = DatasetCache(make_signal(run_label='first'), 4, shard_size=4).build()
+        # a run with another run_label finds the same shards.
+        again = DatasetCache(make_signal(run_label='second'), 4, shard_size=4)
+    finally:
+        os.chdir(cwd)
+    assert cache.cache_dir == again.cache_dir == os.path.join(str(tmpdir), 'out', 'cache', cache.key)
+    assert again.is_complete
+
+
+def test_signal_generator_cache(tmpdir):
+    msig = make_signal()
+    expected = SignalGenerator(12, 4, msig, 'tf_tc', stream=2)
+    cache = DatasetCache(msig, 12, sequence_code='tf_tc', shard_size=5, cache_dir=str(tmpdir), stream=2)
+    generator = SignalGenerator(12, 4, msig, 'tf_tc', cache=cache)
+    for i in range(len(generator)):
+        X, y = generator[i]
+        X1, y1 = expected[i]
+        assert np.array_equal(X, X1) and np.array_equal(y, y1)
+        assert y.dtype == y1.dtype
+    assert cache.is_complete
+
+
+def test_batch_lru():
+    lru = BatchLRU(max_bytes=3 * 800)
+    batch = lambda v: (np.full(50, v, dtype=float), np.zeros(50, dtype=float))  # 800 bytes
+    for i in range(3):
+        lru.put(i, batch(i))
+    assert len(lru) == 3 and lru.nbytes == 2400
+    assert lru.get(0)[0][0] == 0  # 0 is now the most recent
+    lru.put(3, batch(3))
+    assert 1 not in lru and 0 in lru and lru.nbytes == 2400
+    assert lru.get(1) is None and (lru.hits, lru.misses) == (1, 1)
+    lru.put(4, (np.zeros(1000), np.zeros(1)))
+    assert 4 not in lru and len(lru) == 3
+
+
+def test_signal_generator_frozen():
+    msig = make_signal()
+    generator = SignalGenerator(12, 4, msig, 'tf_tc')
+    frozen = SignalGenerator(12, 4, msig, 'tf_tc', frozen=True)
+    small = SignalGenerator(12, 4, msig, 'tf_tc', frozen=True, memory_budget=1, stream=frozen.stream)
+    first = [frozen[i] for i in range(len(frozen))]
+    # a frozen (validation) generator over the training signal doesn't replay the training batches.
+    for i in range(len(frozen)):
+        assert not np.array_equal(generator[i][0], first[i][0])
+    for epoch in range(2):
+        for i in range(len(frozen)):
+            assert np.array_equal(frozen[i][0], first[i][0])
+            assert np.array_equal(small[i][0], first[i][0])
+        frozen.on_epoch_end()
+        small.on_epoch_end()
+    assert frozen.batch_lru.hits == 6 and len(frozen.batch_lru) == 3
+    assert len(small.batch_lru) == 0
+    generator.on_epoch_end()
+    assert not np.array_equal(generator[0][0], first[0][0])
@@ -0,0 +1,45 @@
+import pytest
+import numpy as np
+from mixsig.feeder import WindowFeeder
+from mixsig.mixed import MixedSignal
+from mixsig.utils import sliding_windows
+
+
+@pytest.fixture
+def msig():
+    waves_coeffs = [{'frequency': {'mean': f}} for f in (1, 2)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', window_size=8, run_label='test', seed=0)
+    msig.generate()
+    return msig
+
+
+def test_window_feeder(msig):
+    feeder = WindowFeeder(msig)
+    expected = sliding_windows(msig.inputs, 8)
+    for i, point in enumerate(msig.inputs):
+        window = feeder.push(point)
+        if i < 7:
+            assert window is None and not feeder.ready
+            continue
+        assert window.shape == (1, 8, 2) and not window.flags.writeable
+        assert np.shares_memory(window, feeder._buffer)
+        assert np.array_equal(window[0], expected[i - 7])
+    stats = feeder.latency_stats()
+    assert stats['count'] == len(msig.inputs)
+    assert 0 < stats['p50'] <= stats['p99'] <= stats['max']
+
+
+def test_window_feeder_shapes(msig):
+    feeder = WindowFeeder(msig, window_size=5, sequence_code='xf_xc')
+    with pytest.raises(ValueError):
+        feeder.window()
+    assert np.array_equal(feeder.push(msig.inputs[:20]), msig.inputs[19:20])
+    feeder = WindowFeeder(msig, window_size=5, sequence_code='tf_tc')
+    feeder.push(msig.inputs[:3])
+    assert np.array_equal(feeder.push(msig.inputs[3:14]), msig.inputs[9:14])
+    assert feeder.n_pushed == 14
+    with pytest.raises(NotImplementedError):
+        WindowFeeder(msig, sequence_code='bad_tc')
@@ -0,0 +1,171 @@
+import pytest
+import numpy as np
+from mixsig.kernels import KERNELS
+from mixsig.kernels import Kernel
+from mixsig.kernels import get_kernel
+from mixsig.kernels import register_kernel
+from mixsig.kernels import uniform_sincos
+from mixsig.kernels import uniform_spacing
+from mixsig.utils import timesequence_generator
+from mixsig.waves import Wave
+from mixsig.mixed import MixedSignal
+
+
+@pytest.mark.parametrize('spec', [
+    'sine',
+    'chirp',
+    {'name': 'chirp', 'rate': 3.0},
+    'damped_sine',
+    {'name': 'damped_sine', 'damping': 0.5},
+], ids=repr)
+def test_kernel_derivatives(spec):
+    # compare each analytic derivative with a finite difference of the one below it.
+    kernel = get_kernel(spec)
+    t = np.linspace(0, 2, 20001)
+    w, p = 2 * np.pi * 1.5, 0.3
+    bases = kernel.derivatives(t, w, p, [0, 1, 2, 3])
+    derivs = [base * factor for base, factor in (bases[k] for k in range(4))]
+    for k in range(3):
+        fd = np.gradient(derivs[k], t)
+        scale = np.max(np.abs(derivs[k + 1]))
+        assert np.allclose(fd[1:-1], derivs[k + 1][1:-1], atol=1e-3 * scale), k
+
+
+@pytest.mark.parametrize('name', ['square', 'sawtooth', 'triangle'], ids=repr)
+def test_piecewise_kernels(name):
+    kernel = get_kernel(name)
+    t = np.linspace(0, 2, 20000, endpoint=False)
+    w, p = 2 * np.pi, 0.0
+    bases = kernel.derivatives(t, w, p, [0, 1])
+    x = bases[0][0] * bases[0][1]
+    dxdt = bases[1][0] * bases[1][1] + np.zeros_like(t)
+    assert np.all((-1 <= x) & (x <= 1))
+    assert np.isclose(np.max(x), 1, atol=1e-3) and np.isclose(np.min(x), -1, atol=1e-3)
+    # away from the discontinuities, dxdt matches a finite difference.
+    fd = np.gradient(x, t)
+    jumps = np.abs(np.diff(x)) > 0.5
+    kinks = np.diff(dxdt) != 0
+    smooth = np.ones(len(t), dtype=bool)
+    smooth[:1] = smooth[-1:] = False
+    for bad in (jumps, kinks):
+        smooth[:-1] &= ~bad
+        smooth[1:] &= ~bad
+    assert np.allclose(fd[smooth], dxdt[smooth], atol=1e-6 * w)
+
+
+def test_kernel_batch_broadcast():
+    kernel = get_kernel({'name': 'damped_sine', 'damping': 0.5})
+    t = np.linspace(0, 2, 101)[None, :]
+    w = np.array([[1.0], [2.0], [3.0]])
+    p = np.zeros((3, 1))
+    bases = kernel.derivatives(t, w, p, [0, 1])
+    assert np.shape(bases[0][0] * bases[0][1]) == (3, 101)
+    single = kernel.derivatives(t[0], 2.0, 0.0, [1])
+    assert np.allclose(bases[1][0][1] * bases[1][1], single[1][0] * single[1][1])
+
+
+def test_get_kernel_errors():
+    with pytest.raises(ValueError):
+        get_kernel('badstring')
+    with pytest.raises(TypeError):
+        register_kernel('bad', 42)
+
+
+def test_register_kernel():
+    register_kernel('cosine', np.cos, derivatives=(lambda theta: -np.sin(theta),))
+    assert 'cosine' in KERNELS
+    kernel = get_kernel('cosine')
+    t = np.linspace(0, 2, 101)
+    bases = kernel.derivatives(t, 3.0, 0.0, [0, 1])
+    assert np.allclose(bases[0][0], np.cos(3 * t))
+    assert np.allclose(bases[1][0], -3 * np.sin(3 * t))
+    with pytest.raises(ValueError):
+        kernel.derivatives(t, 3.0, 0.0, [2])
+
+    @register_kernel('half_rectified')
+    class HalfRectifiedKernel(Kernel):
+        def derivative(self, theta, timestamps, w, order):
+            return np.maximum(np.sin(theta), 0) if order == 0 else np.where(np.sin(theta) > 0, w * np.cos(theta), 0)
+
+    assert get_kernel('half_rectified').name == 'half_rectified'
+    del KERNELS['cosine']
+    del KERNELS['half_rectified']
+
+
+@pytest.mark.parametrize('kernel', [None, 'square', 'triangle', {'name': 'chirp', 'rate': 2}], ids=repr)
+def test_wave_with_kernel(kernel):
+    features = ('x', 'dxdt', 'd2xdt2')
+    ts = timesequence_generator(t_min=0.0, t_max=2.0, n_max=201)()
+    wave = Wave(*features, label=0, kernel=kernel, amplitude={'mean': 2}, offset={'mean': 1})
+    wave.generate(ts)
+    x = wave.inputs[:, 0]
+    assert wave.inputs.shape == (201, len(features))
+    assert np.all((-1 <= x) & (x <= 3 + 1e-9))
+    inputs, _ = wave.generate_batch(4, ts)
+    assert inputs.shape == (4, 201, len(features))
+
+
+def test_mixed_signal_with_kernels():
+    waves_coeffs = [{'kernel': 'square'}, {'kernel': 'sawtooth'}, {'kernel': {'name': 'damped_sine', 'damping': 1}}]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 301}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', run_label='test')
+    X, y = msig.generate()
+    assert X.shape == (301, 2)
+    assert msig.wave_bank is None
+
+    waves_coeffs = [{'kernel': 'triangle', 'frequency': {'mean': f}} for f in range(1, 4)]
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', run_label='test', backend='bank')
+    assert msig.wave_bank.kernel == get_kernel('triangle')
+    X, y = msig.generate()
+    assert X.shape == (301, 2)
+
+
+@pytest.mark.parametrize('n,t_max,frequency', [(5000, 2, 1.0), (100001, 50, 3.3), (1000000, 5000, 3.3)], ids=repr)
+def test_uniform_sincos(n, t_max, frequency):
+    t = np.linspace(0, t_max, n)
+    w, p = 2 * np.pi * frequency, 0.7
+    assert uniform_spacing(t) is not None
+    sin, cos = uniform_sincos(*uniform_spacing(t), n, w, p)
+    theta = w * t - p
+    bound = np.finfo(float).eps * (4 + np.max(np.abs(theta)))
+    # compare against the direct evaluation; both are within the bound of the exact value.
+    assert sin.shape == cos.shape == (n,)
+    assert np.max(np.abs(sin - np.sin(theta))) <= 2 * bound
+    assert np.max(np.abs(cos - np.cos(theta))) <= 2 * bound
+
+
+def test_uniform_spacing():
+    t = np.linspace(0, 2, 10000, endpoint=False)
+    assert np.allclose(uniform_spacing(t), (0, 2 / 10000))
+    jitter = timesequence_generator(t_min=0, t_max=2, n_max=10000, noise_type='jitter', delta=0.5)()
+    assert uniform_spacing(jitter) is None
+    assert uniform_spacing(t[[0, 1, 3, 4]]) is None
+    assert uniform_spacing(t[::-1]) is None
+
+
+def test_sine_kernel_phasor_path():
+    kernel = get_kernel('sine')
+    t = np.linspace(0, 10, 50000)
+    w, p = 2 * np.pi * 2.5, 1.1
+    bases = kernel.derivatives(t, w, p, [0, 1, 2, 3])
+    theta = w * t - p
+    assert np.allclose(bases[0][0] * bases[0][1], np.sin(theta), rtol=0, atol=1e-12)
+    assert np.allclose(bases[3][0] * bases[3][1], -w ** 3 * np.cos(theta), rtol=0, atol=1e-12 * w ** 3)
+
+
+@pytest.mark.parametrize('name', ['sine', 'chirp', 'square', 'sawtooth', 'triangle'])
+@pytest.mark.parametrize('t0', [0.0, 1e3, 1e4], ids=repr)
+def test_float32_phase_at_large_times(name, t0):
+    kernel = get_kernel(name)
+    # jittered, so the sine kernel doesn't take the phasor path.
+    t = t0 + np.sort(np.random.default_rng(0).uniform(0, 1, 501))
+    w, p = 2 * np.pi * 1.3, 0.4
+    exact = kernel.derivatives(t, w, p, [0])[0]
+    base, factor = kernel.derivatives(t, w, p, [0], dtype=np.float32)[0]
+    assert base.dtype == np.float32
+    error = np.abs(base * factor - exact[0] * exact[1])
+    if name == 'square':
+        error = error[np.abs(np.sin(w * t - p)) > 1e-5]  # away from the jumps
+    assert np.max(error) < 1e-6
@@ -1,11 +1,17 @@
 import os
 import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 import pytest
 from distutils.dir_util import copy_tree
 from pytest import fixture
 import numpy as np
 from mixsig.mixed import MixedSignal
+from mixsig.mixed import SignalGenerator
+from mixsig.mixed import StatefulSignalGenerator
+from mixsig.mixed import STATEFUL_KEY
 from mixsig.utils import string2shape
+from mixsig.utils import sliding_windows
 # class TestMixedSignal:
 #     def test___init__(self):
 #         msig = MixedSignal()
@@ -498,6 +504,60 @@ def test_generate_sliding(sequence_type, window_size, n_features, n_classes):
     assert y.shape == out_shape, print(msig.sequence_code)
 
 
+@pytest.mark.parametrize('sequence_code', ['xw1_xw1', 'xwf_xwc', 'xwf_xc'], ids=repr)
+def test_generate_sliding_views(sequence_code):
+    window_size = 7
+    waves_coeffs = [{'frequency': {'mean': f}} for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 301}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', window_size=window_size,
+                       run_label='test', copy_windows=False)
+    msig.generate()
+    X_view, y_view = msig.generate_sliding(sequence_code)
+    X_copy, y_copy = msig.generate_sliding(sequence_code, copy=True)
+    assert np.array_equal(X_view, X_copy) and np.array_equal(y_view, y_copy)
+    assert np.shares_memory(X_view, msig.inputs) and not X_view.flags.writeable
+    assert not np.shares_memory(X_copy, msig.inputs) and X_copy.flags.c_contiguous
+    for j in range(window_size):
+        assert np.array_equal(X_copy[:, j], msig.inputs[j:j + msig.n_samples])
+    if sequence_code == 'xw1_xw1':
+        assert y_view.dtype == y_copy.dtype == np.float64
+        assert np.array_equal(y_copy[:, 0, 0], msig.labels[:msig.n_samples])
+
+
+@pytest.mark.parametrize('features', [('x',), ('x', 'dxdt', 'd2xdt2')], ids=repr)
+def test_generate_sliding_many2one_time(features):
+    window_size = 10
+    n_timestamps = 301
+    waves_coeffs = [{'frequency': {'mean': f}} for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps, 'noise_type': 'pareto'}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], *features, window_size=window_size,
+                       sequence_type='many2one+time', network_type='PLSTM', run_label='test')
+    X, y = msig.generate()
+    n_samples = n_timestamps - window_size + 1
+    assert X.shape == (n_samples, window_size, len(features) + 1)
+    assert y.shape == (n_samples, 3)
+    for i in (0, n_samples // 2, n_samples - 1):
+        t = msig.timestamps[i:i + window_size]
+        assert np.array_equal(X[i, :, :-1], msig.inputs[i:i + window_size])
+        assert np.allclose(X[i, :, -1], t[-1] - t)
+    assert np.all(X[:, -1, -1] == 0) and np.all(X[:, :, -1] >= 0)
+
+    # the time channel is counted in the sequence code and shapes.
+    assert msig.sequence_code == 'xwf_xc'
+    assert msig.in_out_shape_decoder(msig.sequence_code) == (X.shape, y.shape)
+    generator = SignalGenerator(4, 2, msig, msig.sequence_code)
+    X_batch, y_batch = generator[0]
+    assert X_batch.shape == (2,) + X.shape and y_batch.shape == (2,) + y.shape
+
+    with pytest.raises(ValueError):
+        MixedSignal([mwave_coeffs, *waves_coeffs], *features, window_size=window_size, window_type='boxcar',
+                    sequence_type='many2one+time', network_type='PLSTM', run_label='test')
+
+
 @pytest.mark.parametrize('n_classes', [2, 3], ids=repr)
 @pytest.mark.parametrize('n_features', [1, 2], ids=repr)
 @pytest.mark.parametrize('batch_size', [1, 5], ids=repr)
@@ -711,3 +771,458 @@ def test_generate_samples():
     assert X.shape == (n_samples, 2*n_timestamps, n_features)
     assert y.shape == (n_samples, 2*n_timestamps, n_classes)
 
+    X = np.full((n_samples, 2*n_timestamps, n_features), np.nan)
+    y = np.zeros((n_samples, 2*n_timestamps, n_classes), dtype=np.float32)
+    X_out, y_out = msig.generate_samples(n_samples, out=(X, y))
+    assert X_out is X and y_out is y
+    assert not np.isnan(X).any()
+    assert np.all(y.sum(axis=-1) == 1)
+
+    with pytest.raises(ValueError):
+        msig.generate_samples(n_samples + 1, out=(X, y))
+
+
+@pytest.mark.parametrize('window_size', [0, 5], ids=repr)
+def test_generate_samples_matches_generate(window_size):
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}} for f in (1, 2)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    kwargs = dict(window_size=window_size, run_label='test', seed=3)
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', **kwargs)
+    X, y = msig.generate_samples(4)
+    assert msig.copy_windows
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', **kwargs)
+    for i in range(4):
+        Xi, yi = msig.generate()
+        assert np.array_equal(X[i], Xi) and np.array_equal(y[i], yi)
+
+
+def test_iter_and_save_samples(tmpdir):
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}} for f in (1, 2)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    kwargs = dict(run_label='test', seed=5)
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', **kwargs)
+    X, y = msig.generate_samples(10)
+
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', **kwargs)
+    chunks = [(Xc.copy(), yc.copy()) for Xc, yc in msig.iter_samples(10, chunk_size=4)]
+    assert [len(Xc) for Xc, _ in chunks] == [4, 4, 2]
+    assert np.array_equal(np.concatenate([Xc for Xc, _ in chunks]), X)
+    assert np.array_equal(np.concatenate([yc for _, yc in chunks]), y)
+
+    msig = MixedSignal([dict(mwave_coeffs), *waves_coeffs], 'x', 'dxdt', **kwargs)
+    x_filename, y_filename = msig.save_samples(10, chunk_size=3, out_dir=str(tmpdir))
+    assert np.array_equal(np.load(x_filename, mmap_mode='r'), X)
+    assert np.array_equal(np.load(y_filename), y)
+
+
+def test_generate_with_seed():
+    n_timestamps = 301
+    waves_coeffs = [
+        {'frequency': {'mean': 1, 'delta': 0.5}, 'noise': {'normal': {'mu': 0.0, 'sigma': 0.1}}},
+        {'frequency': {'mean': 2, 'delta': 0.5}},
+    ]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'phase': {'mean': 0, 'delta': 1},
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps}}
+
+    def build(seed):
+        sigs_coeffs = [dict(mwave_coeffs), *[dict(c) for c in waves_coeffs]]
+        return MixedSignal(sigs_coeffs, window_size=10, run_label='test', seed=seed)
+
+    msig1 = build(42)
+    msig2 = build(42)
+    msig3 = build(43)
+    X1, y1 = msig1.generate()
+    X2, y2 = msig2.generate()
+    X3, y3 = msig3.generate()
+    assert [w.name for w in msig1.waves] == [w.name for w in msig2.waves]
+    assert np.all(X1 == X2) and np.all(y1 == y2)
+    assert not np.allclose(X1, X3)
+
+
+def test_generate_with_philox_bit_generator():
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', seed=7, bit_generator='Philox')
+    assert isinstance(msig.waves[0].rng.bit_generator, np.random.Philox)
+    X, y = msig.generate()
+    assert X.shape == (101, 1)
+
+
+@pytest.mark.parametrize('with_independent', [False, True], ids=repr)
+def test_generate_wave_bank_matches_waves(with_independent):
+    features = ('x', 'dxdt', 'time')
+    waves_coeffs = [{'frequency': {'mean': f}, 'offset': {'mean': 0.1 * f}} for f in range(1, 6)]
+    if with_independent:
+        waves_coeffs.append({
+            'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 50, 'noise_type': 'pareto'},
+            'amplitude': {'mean': 3}})
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'amplitude': {'mean': 2},
+        'offset': {'mean': 1},
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 301}}
+
+    msigs = {}
+    for backend in ('waves', 'bank'):
+        sigs_coeffs = [dict(mwave_coeffs), *[dict(c) for c in waves_coeffs]]
+        msigs[backend] = MixedSignal(sigs_coeffs, *features, run_label='test', seed=3, backend=backend)
+    assert msigs['waves'].wave_bank is None
+    assert msigs['bank'].wave_bank is not None
+
+    X_waves, y_waves = msigs['waves'].generate()
+    X_bank, y_bank = msigs['bank'].generate()
+    assert X_waves.shape == X_bank.shape
+    assert y_waves.shape == y_bank.shape
+    # with all deltas zero and no noise, both backends produce the same signal.
+    assert np.allclose(X_waves, X_bank)
+    assert np.all(y_waves == y_bank)
+    msig = msigs['bank']
+    for label, wave in enumerate(msig.waves):
+        mask = msig.labels == label
+        t = msig.timestamps[mask]
+        a, f, o = wave.amplitude.mean, wave.frequency.mean, wave.offset.mean
+        if not wave.is_independent:
+            a, f, o = a * 2, f, o + 1
+        assert np.allclose(msig.inputs[mask, 0], a * np.sin(2 * np.pi * f * t) + o)
+        assert np.allclose(msig.inputs[mask, 1], a * 2 * np.pi * f * np.cos(2 * np.pi * f * t))
+        assert np.allclose(msig.inputs[mask, 2], t)
+
+
+def test_wave_bank_auto_backend():
+    n_classes = MixedSignal.wavebank_min_classes
+    waves_coeffs = [{'frequency': {'mean': 1 + i, 'delta': 0.5}, 'noise': {'normal': {'mu': 0, 'sigma': 0.1}}}
+                    for i in range(n_classes)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 1000}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], window_size=10, run_label='test')
+    assert msig.wave_bank is not None
+    X, y = msig.generate()
+    assert X.shape == (1000 - 10 + 1, 10, 1)
+    assert y.shape == (1000 - 10 + 1, 10, n_classes)
+    assert np.all(np.diff(msig.timestamps) >= 0)
+
+
+@pytest.mark.parametrize('backend', ['waves', 'bank'], ids=repr)
+@pytest.mark.parametrize('label_dtype', [None, np.uint8], ids=repr)
+def test_generate_with_dtype(backend, label_dtype):
+    features = ('x', 'dxdt')
+    waves_coeffs = [{'frequency': {'mean': 1, 'delta': 0.5}}] * 3
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 301}}
+    msig = MixedSignal(
+        [mwave_coeffs, *waves_coeffs],
+        *features,
+        window_size=10,
+        sequence_type='many2many',
+        run_label='test',
+        backend=backend,
+        dtype=np.float32,
+        label_dtype=label_dtype,
+    )
+    X, y = msig.generate()
+    assert X.dtype == np.float32
+    assert msig.timestamps.dtype == np.float32
+    assert msig.inputs.dtype == np.float32
+    if label_dtype is None:
+        assert y.dtype == np.float32
+        assert msig.labels.dtype == int
+    else:
+        assert y.dtype == label_dtype
+        assert msig.labels.dtype == label_dtype
+    assert np.allclose(y.sum(axis=-1), 1)
+
+    X, y = msig.generate(sequence_code='tf_t1')
+    assert X.dtype == np.float32
+
+
+def test_signal_generator_dtype():
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}},
+                   {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'frequency': {'mean': 2}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', dtype='float32', label_dtype='uint8')
+    msig.generate()
+    generator = SignalGenerator(8, 4, msig, 'tf_tc')
+    assert len(generator) == 2
+    X, y = generator[0]
+    assert X.shape == (4, 202, 1) and X.dtype == np.float32
+    assert y.shape == (4, 202, 2) and y.dtype == np.uint8
+
+
+@pytest.mark.parametrize('use_processes', [False, True], ids=repr)
+def test_signal_generator_prefetch(use_processes):
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}},
+                   {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'frequency': {'mean': 2}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', seed=1)
+    msig.generate()
+    generator = SignalGenerator(12, 4, msig, 'tf_tc', n_workers=2, prefetch=2, use_processes=use_processes)
+    for epoch in range(2):
+        batches = [generator[i] for i in range(len(generator))]
+        assert generator._executor is not None
+        generator.on_epoch_end()
+        assert generator._executor is None and not generator._pending
+        for X, y in batches:
+            assert X.shape == (4, 202, 1) and y.shape == (4, 202, 2)
+            assert np.all(y.sum(axis=-1) == 1)
+        # different workers (and epochs) draw different phases.
+        X = np.concatenate([X for X, _ in batches])
+        assert len(np.unique(X[:, :, 0].round(8), axis=0)) == len(X)
+
+
+def test_signal_generator_shared_memory():
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}},
+                   {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'frequency': {'mean': 2}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', seed=1, dtype='float32')
+    msig.generate()
+    with pytest.raises(ValueError):
+        SignalGenerator(12, 4, msig, 'tf_tc', n_workers=2, shared_memory=True)
+    generator = SignalGenerator(20, 4, msig, 'tf_tc', n_workers=2, prefetch=1, use_processes=True, shared_memory=True)
+    batches = []
+    for i in [0, 1, 2, 4, 0, 3]:
+        X, y = generator[i]
+        assert X.shape == (4, 202, 1) and X.dtype == np.float32
+        assert y.shape == (4, 202, 2) and np.all(y.sum(axis=-1) == 1)
+        assert X.base is not None  # a view of the ring, not an unpickled copy
+        batches.append(X.copy())
+    assert len(generator._free_slots) + len(generator._pending) + 1 == generator._ring.n_slots
+    del X, y
+    generator.on_epoch_end()
+    assert generator._ring is None
+    # batch 0 was requested twice and is regenerated exactly; every other sample is different.
+    assert np.array_equal(batches[0], batches[4])
+    assert len(np.unique(np.concatenate(batches)[:, :, 0].round(6), axis=0)) == 4 * (len(batches) - 1)
+
+
+def _generate_pickled(msig):
+    return msig.generate()
+
+
+def test_mixed_signal_pickle():
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'noise': {'uniform': {'mu': 0, 'delta': 0.1}}}
+                    for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101, 'noise_type': 'pareto'}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', window_size=10, run_label='test', seed=11)
+    msig.generate()
+    copied = pickle.loads(pickle.dumps(msig))
+    assert copied.data_config == msig.data_config
+    X, y = msig.generate()
+    X1, y1 = copied.generate()
+    assert np.array_equal(X, X1) and np.array_equal(y, y1)
+
+    # and across a process boundary.
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        X2, y2 = executor.submit(_generate_pickled, msig).result()
+    X, y = msig.generate()
+    assert np.array_equal(X, X2) and np.array_equal(y, y2)
+
+
+def test_generate_at():
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'noise': {'normal': {'mu': 0, 'sigma': 0.1}}}
+                    for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101, 'noise_type': 'pareto'}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', run_label='test', seed=2, bit_generator='Philox')
+    X, y = msig.generate_at(5, epoch=1)
+    msig.generate()
+    msig.generate_at(4, epoch=1)
+    X1, y1 = msig.generate_at(5, epoch=1)
+    assert np.array_equal(X, X1) and np.array_equal(y, y1)
+    X2, _ = msig.generate_at(5, epoch=2)
+    assert not np.array_equal(X, X2)
+    X3, _ = pickle.loads(pickle.dumps(msig)).generate_at(5, epoch=1)
+    assert np.array_equal(X, X3)
+
+
+def test_generate_at_bank():
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'noise': {'uniform': {'mu': 0, 'delta': 0.1}}}
+                    for f in (1, 2, 3)]
+    mwave_coeffs = {'name': 'mixed_wave', 'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    independent = {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 51, 'noise_type': 'jitter'}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs, independent], run_label='test', seed=2, backend='bank')
+    assert msig._generate_rngs == [0, 1, 5]
+    X, y = msig.generate_at(5)
+    msig.generate()
+    msig.waves[0].rng.random()  # not drawn from by the WaveBank, so not reseeded either.
+    X1, y1 = msig.generate_at(5)
+    assert np.array_equal(X, X1) and np.array_equal(y, y1)
+
+    # reseeding a subset gives those generators the same streams as a full reseed.
+    states = [rng.bit_generator.state for rng in msig._rngs]
+    msig.reseed(7)
+    full = [rng.bit_generator.state for rng in msig._rngs]
+    for rng, state in zip(msig._rngs, states):
+        rng.bit_generator.state = state
+    msig.reseed(7, rngs=[1, 5])
+    assert [rng.bit_generator.state for rng in msig._rngs] == [states[0], full[1], *states[2:5], full[5], *states[6:]]
+
+
+@pytest.mark.parametrize('bit_generator', ['PCG64', 'Philox', 'MT19937'], ids=repr)
+def test_reseed(bit_generator):
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}} for f in (1, 2, 3)]
+    mwave_coeffs = {'name': 'mixed_wave', 'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], run_label='test', seed=2, bit_generator=bit_generator)
+    msig.reseed(3)
+    draws = [rng.random(4) for rng in msig._rngs]
+    assert len(np.unique(np.concatenate(draws))) == 4 * len(draws)  # one stream per generator
+    msig.reseed(3)
+    assert all(np.array_equal(rng.random(4), d) for rng, d in zip(msig._rngs, draws))
+    X, _ = msig.generate_at(1)
+    msig.generate()
+    assert np.array_equal(msig.generate_at(1)[0], X)
+
+
+@pytest.mark.parametrize('n_workers,use_processes', [(0, False), (2, False), (2, True)], ids=repr)
+def test_signal_generator_random_access(n_workers, use_processes):
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}},
+                   {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'frequency': {'mean': 2, 'delta': 1}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', seed=4)
+    msig.generate()
+    reference = SignalGenerator(16, 4, msig, 'tf_tc', shuffle=True, stream=7)
+    expected = [[reference[i] for i in range(len(reference))]]
+    reference.on_epoch_end()
+    expected.append([reference[i] for i in range(len(reference))])
+    assert not np.array_equal(reference.indexes, np.arange(16))
+
+    generator = SignalGenerator(16, 4, msig, 'tf_tc', shuffle=True, n_workers=n_workers, use_processes=use_processes,
+                                stream=7)
+    for epoch in range(2):
+        for i in [3, 0, 2, 1]:
+            X, y = generator[i]
+            assert np.array_equal(X, expected[epoch][i][0]) and np.array_equal(y, expected[epoch][i][1])
+        generator.on_epoch_end()
+
+
+def test_signal_generator_streams():
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'phase': {'mean': 0, 'delta': 1}},
+                   {'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}, 'frequency': {'mean': 2, 'delta': 1}}]
+    msig = MixedSignal(sigs_coeffs, run_label='test', seed=4)
+    msig.generate()
+    train = SignalGenerator(16, 8, msig, 'tf_tc', shuffle=True)
+    validation = SignalGenerator(16, 8, msig, 'tf_tc')
+    assert train.stream != validation.stream
+    assert validation.stream != 0  # reserved for direct generate_at calls
+    samples = np.concatenate([train[0][0], train[1][0], validation[0][0], validation[1][0],
+                              msig.generate_at(0)[0][None], msig.generate_at(1)[0][None]])
+    assert len(np.unique(samples[:, :, 0].round(8), axis=0)) == len(samples)
+    # an explicit stream id reproduces the samples of that stream.
+    assert np.array_equal(SignalGenerator(16, 8, msig, 'tf_tc', stream=train.stream)[0][0],
+                          np.stack([msig.generate_at(i, stream=train.stream)[0] for i in range(8)]))
+
+
+def test_generate_unsorted_block_boxcar():
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 101}},
+                   {'time': {'t_min': 0.5, 't_max': 2.5, 'n_timestamps': 100}}]
+    msig = MixedSignal(sigs_coeffs, 'x', 'time', window_size=4, window_type='boxcar', run_label='test')
+    # jittered timestamps can come out of order; the first two points here are swapped.
+    ts = np.linspace(0, 2, 101, endpoint=False)
+    ts[[0, 1]] = ts[[1, 0]]
+    msig.waves[0]._timestamp_generator = lambda: ts
+    msig.generate()
+    assert len(msig.timestamps) == 200 and np.all(np.diff(msig.timestamps) >= 0)
+    assert np.array_equal(msig.inputs[:, 1], msig.timestamps)
+    assert np.count_nonzero(msig.labels == 1) == 100 and msig.labels[-1] == 1
+
+
+def test_generate_chunked(tmpdir):
+    n_timestamps = 100
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'phase': {'mean': 0, 'delta': 1}} for f in (1, 2, 3)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', 'dxdt', run_label='test', seed=8, label_dtype='uint8')
+    timestamps, labels, inputs = msig.generate_chunked(5, out_dir=str(tmpdir))
+    assert isinstance(inputs, np.memmap) and inputs.shape == (5 * n_timestamps, 2)
+    assert labels.dtype == np.uint8
+    assert np.allclose(np.diff(timestamps), 2 / n_timestamps)
+    # the properties are fixed, so every class is one continuous wave across the chunks.
+    for i, wave in enumerate(msig.waves):
+        a, w, o, p = wave._wp
+        t = timestamps[labels == i]
+        assert np.allclose(inputs[labels == i, 0], a * np.sin(w * t - p) + o)
+        assert np.allclose(inputs[labels == i, 1], a * w * np.cos(w * t - p))
+
+    windows = sliding_windows(inputs, 150, copy=False)
+    assert np.array_equal(windows[80, :, 0], inputs[80:230, 0])
+
+    independent = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps}},
+                   {'time': {'t_min': 0, 't_max': 3, 'n_timestamps': n_timestamps}}]
+    msig = MixedSignal(independent, run_label='test')
+    with pytest.raises(ValueError):
+        msig.generate_chunked(2, out_dir=str(tmpdir))
+
+
+def test_stream():
+    n_timestamps = 200
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'phase': {'mean': 0, 'delta': 1}} for f in (1, 2)]
+    sigs_coeffs = [{'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps}, **coeffs}
+                   for coeffs in waves_coeffs]
+    msig = MixedSignal(sigs_coeffs, 'x', 'dxdt', run_label='test', seed=9)
+    stream = msig.stream()
+    blocks = [next(stream) for _ in range(4)]
+    timestamps = np.concatenate([b[0] for b in blocks])
+    labels = np.concatenate([b[1] for b in blocks])
+    inputs = np.concatenate([b[2] for b in blocks])
+    assert len(timestamps) == 4 * 2 * n_timestamps and np.all(np.diff(timestamps) >= 0)
+    assert timestamps[-1] < 8 <= next(stream)[0][0]
+    for i, wave in enumerate(msig.waves):
+        a, w, o, p = wave._wp
+        t = timestamps[labels == i]
+        x = inputs[labels == i, 0]
+        assert np.allclose(x, a * np.sin(w * t - p) + o)
+        # no jump at the block boundaries: the steps there are no bigger than anywhere else.
+        assert np.max(np.abs(np.diff(x))) <= a * w * 2 / n_timestamps * 1.01
+
+
+@pytest.mark.parametrize('time', [{'noise_type': 'pareto'}, {'endpoint': True}], ids=repr)
+def test_stream_block_boundaries(time):
+    n_timestamps = 50
+    waves_coeffs = [{'frequency': {'mean': f}} for f in (1, 2)]
+    mwave_coeffs = {'name': 'mixed_wave', 'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps, **time}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], run_label='test', seed=3)
+    blocks = [b[0] for b in msig.stream(4)]
+    # these sequences start on t_min and end on t_max; the boundary timestamp must not repeat.
+    assert all(np.isclose(blocks[k][0], blocks[k - 1][-1] + 2 / (n_timestamps - 1)) for k in range(1, 4))
+    timestamps = np.concatenate(blocks)
+    assert np.all(np.diff(timestamps) > 0)
+    if 'endpoint' in time:
+        assert np.allclose(np.diff(timestamps), 2 / (n_timestamps - 1))
+
+
+def test_stateful_signal_generator():
+    n_timestamps = 50
+    waves_coeffs = [{'frequency': {'mean': f, 'delta': 0.5}, 'phase': {'mean': 0, 'delta': 1}} for f in (1, 2)]
+    mwave_coeffs = {
+        'name': 'mixed_wave',
+        'time': {'t_min': 0, 't_max': 1, 'n_timestamps': n_timestamps}}
+    msig = MixedSignal([mwave_coeffs, *waves_coeffs], 'x', run_label='test', seed=6)
+    generator = StatefulSignalGenerator(msig, batch_size=3, segment_length=40, n_segments=5)
+    batches = [generator[k] for k in range(len(generator))]
+    assert generator[4][0] is batches[-1][0]
+    with pytest.raises(IndexError):
+        generator[0]
+    X = np.concatenate([b[0] for b in batches], axis=1)
+    y = np.concatenate([b[1] for b in batches], axis=1)
+    assert X.shape == (3, 200, 1) and y.shape == (3, 200, 2)
+
+    # row i of the batches, laid end to end, is one continuous recording.
+    for row in range(3):
+        copied = pickle.loads(pickle.dumps(msig))
+        copied.reseed(msig.seed_sequence(STATEFUL_KEY, generator.stream, 0, row))
+        _, labels, inputs = map(np.concatenate, zip(*copied.stream(4)))
+        assert np.array_equal(X[row], inputs[:200])
+        assert np.array_equal(y[row].argmax(axis=-1), labels[:200])
+    assert not np.array_equal(X[0], X[1])
+    # a stateful row is not the generate_at sample with the same index.
+    for row in range(3):
+        assert not np.array_equal(X[row, :n_timestamps, 0], msig.generate_at(row, stream=generator.stream)[0][:, 0])
+
+    generator.on_epoch_end()
+    assert not np.array_equal(generator[0][0], batches[0][0])
@@ -9,6 +9,10 @@ from mixsig.utils import create_one_hots_from_labels
 from mixsig.utils import generate_labels
 from mixsig.utils import one_hot_encode
 from mixsig.utils import one_hot_decode
+from mixsig.utils import spawn_generators
+from mixsig.utils import merge_sorted_blocks
+from mixsig.utils import uniform_noise_generator
+from mixsig.utils import normal_noise_generator
 
 
 @pytest.mark.parametrize('t_min,t_max,n_max,n_timestamps', [
@@ -110,3 +114,64 @@ def test_one_hot_encoder_decoder_1():
     assert np.max(decoded) == n_classes - 1
 
     assert np.all(sequence == decoded)
+
+
+def test_spawn_generators():
+    rngs1 = spawn_generators(12345, 3)
+    rngs2 = spawn_generators(12345, 3)
+    assert len(rngs1) == 3
+    draws1 = [rng.random(5) for rng in rngs1]
+    draws2 = [rng.random(5) for rng in rngs2]
+    assert all(np.all(d1 == d2) for d1, d2 in zip(draws1, draws2))
+    assert not np.allclose(draws1[0], draws1[1])
+    philox = spawn_generators(12345, 1, bit_generator='Philox')[0]
+    assert isinstance(philox.bit_generator, np.random.Philox)
+
+
+@pytest.mark.parametrize('noise_type', [None, 'jitter', 'pareto'], ids=repr)
+def test_generators_with_rng(noise_type):
+    gen1 = timesequence_generator(t_min=0, t_max=50, n_min=100, n_max=200, noise_type=noise_type,
+                                  rng=np.random.default_rng(1))
+    gen2 = timesequence_generator(t_min=0, t_max=50, n_min=100, n_max=200, noise_type=noise_type,
+                                  rng=np.random.default_rng(1))
+    assert np.all(gen1() == gen2())
+
+    for noise_generator in (uniform_noise_generator, normal_noise_generator):
+        noise1 = noise_generator(rng=np.random.default_rng(2))(10)
+        noise2 = noise_generator(rng=np.random.default_rng(2))(10)
+        assert np.all(noise1 == noise2)
+
+    labels1 = generate_labels(20, 3, rng=np.random.default_rng(3))
+    labels2 = generate_labels(20, 3, rng=np.random.default_rng(3))
+    assert np.all(labels1 == labels2)
+
+
+def test_merge_sorted_blocks():
+    rng = np.random.default_rng(0)
+    blocks = []
+    for k, n in enumerate([50, 1, 80, 30]):
+        t = np.sort(rng.integers(0, 40, n)).astype(float)  # plenty of ties
+        blocks.append((t, np.full(n, k), rng.random((n, 2))))
+    t = np.concatenate([b[0] for b in blocks])
+    labels = np.concatenate([b[1] for b in blocks])
+    inputs = np.vstack([b[2] for b in blocks])
+    order = np.argsort(t, kind='stable')
+    for skip in (0, 7, 60):
+        merged = merge_sorted_blocks(blocks, skip=skip)
+        assert np.array_equal(merged[0], t[order][skip:])
+        assert np.array_equal(merged[1], labels[order][skip:])
+        assert np.array_equal(merged[2], inputs[order][skip:])
+    single = merge_sorted_blocks(blocks[:1], skip=3)
+    assert np.shares_memory(single[2], blocks[0][2]) and len(single[0]) == 47
+    with pytest.raises(ValueError):
+        merge_sorted_blocks([])
+
+
+def test_merge_sorted_blocks_unsorted():
+    # jittered timestamps are not always sorted; skipped rows must not wrap around to the end.
+    merged = merge_sorted_blocks([(np.array([5., 0.]), np.array([10, 11])),
+                                  (np.array([1., 2.]), np.array([20, 21]))], skip=1)
+    assert np.array_equal(merged[0], [1., 2., 5.])
+    assert np.array_equal(merged[1], [20, 21, 10])
+    single = merge_sorted_blocks([(np.array([0., 3., 2., 4.]), np.arange(4))], skip=1)
+    assert np.array_equal(single[0], [2., 3., 4.]) and np.array_equal(single[1], [2, 1, 3])
@@ -1,4 +1,5 @@
 import pytest
+import pickle
 from math import isclose
 import numpy as np
 from hypothesis import given
@@ -80,6 +81,65 @@ def test_waveproperty_call(Wp, key):
         assert isclose(wp + kwargs[key], wp1)
 
 
+@pytest.mark.parametrize('delta', [0, 1.0], ids=repr)
+@pytest.mark.parametrize('Wp', [WaveProperty, Amplitude, Frequency, Offset, Phase], ids=repr)
+def test_waveproperty_sample(Wp, delta):
+    wp = Wp(5, delta)
+    value = wp.value
+    samples = wp.sample(1000)
+    assert isinstance(samples, np.ndarray)
+    assert samples.shape == (1000,)
+    assert wp.value == value
+    if isclose(delta, 0):
+        assert np.all(samples == 5)
+    elif Wp is Phase:
+        assert np.all((0 <= samples) & (samples < 1))
+    else:
+        assert np.all((4 <= samples) & (samples <= 6))
+        assert len(np.unique(samples)) > 1
+    assert wp.sample((4, 1)).shape == (4, 1)
+
+
+@pytest.mark.parametrize('Wp,key', [
+    (Amplitude, 'amplitude'),
+    (Frequency, 'frequency'),
+    (Offset, 'offset'),
+    (Phase, 'phase'),
+], ids=repr)
+def test_waveproperty_sample_kwargs(Wp, key):
+    wp = Wp(5)
+    kwargs = {'amplitude': 6.0, 'frequency': 7.0, 'offset': 8.0, 'phase': 9.0}
+    samples = wp.sample(10, **kwargs)
+    assert np.allclose(samples, wp(**kwargs))
+
+
+@pytest.mark.parametrize('distribution,values', [
+    ('normal', None),
+    ('loguniform', None),
+    ('choice', [1, 2, 3]),
+], ids=repr)
+def test_waveproperty_distributions(distribution, values):
+    wp = WaveProperty(5, 2, distribution=distribution, values=values)
+    assert isinstance(wp(), float)
+    samples = wp.sample(1000)
+    assert samples.shape == (1000,)
+    if distribution == 'loguniform':
+        assert np.all((3 <= samples) & (samples <= 7))
+    elif distribution == 'choice':
+        assert set(np.unique(samples)) <= {1, 2, 3}
+    assert len(np.unique(samples)) > 1
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'distribution': 'badstring'},
+    {'distribution': 'choice'},
+    {'distribution': 'loguniform', 'mean': 1, 'delta': 1},
+], ids=repr)
+def test_waveproperty_distribution_errors(kwargs):
+    with pytest.raises(ValueError):
+        WaveProperty(**kwargs)
+
+
 @pytest.mark.parametrize('Wp1', [WaveProperty, Amplitude, Frequency, Offset, Phase], ids=repr)
 @pytest.mark.parametrize('Wp2', [WaveProperty, Amplitude, Frequency, Offset, Phase], ids=repr)
 def test_waveproperty_dunders(Wp1, Wp2):
@@ -289,6 +349,67 @@ def test_wave_with_3_features():
     assert wave.inputs.shape == (n_timestamps, len(features))
 
 
+def test_wave_feature_plan_matches_analytic():
+    n_timestamps = 201
+    features = ('time', 'd3xdt3', 'x', 'd2xdt2', 'dxdt')
+    sequence_generator = timesequence_generator(t_min=0.0, t_max=2.0, n_max=n_timestamps)
+    ts = sequence_generator()
+    params = {
+        'amplitude': {'mean': 2},
+        'frequency': {'mean': 3},
+        'offset': {'mean': -1},
+        'phase': {'mean': 0.1},
+        'noise': {'normal': {'mu': 0.0, 'sigma': 0.5}},
+    }
+    wave = Wave(*features, **params)
+    wave.generate(ts)
+    a, w, o, p = wave._wp
+    theta = w * ts - p
+    assert np.allclose(wave.inputs[:, 0], ts)
+    assert np.allclose(wave.inputs[:, 1], -a * w ** 3 * np.cos(theta))
+    assert np.allclose(wave.inputs[:, 2], a * np.sin(theta) + o + wave.noise)
+    assert np.allclose(wave.inputs[:, 3], -a * w ** 2 * np.sin(theta))
+    assert np.allclose(wave.inputs[:, 4], a * w * np.cos(theta))
+    assert np.allclose(wave.sample, wave.inputs[:, 2])
+    assert np.allclose(wave.d0xdt0(), wave.inputs[:, 2])
+
+
+@pytest.mark.parametrize('noise', [None, {'normal': {'mu': 0.0, 'sigma': 0.5}}], ids=repr)
+def test_wave_sparse_evaluation(noise):
+    n_timestamps = 301
+    features = ('x', 'dxdt', 'time')
+    sequence_generator = timesequence_generator(t_min=0.0, t_max=2.0, n_max=n_timestamps)
+    ts = sequence_generator()
+    indices = np.sort(np.random.choice(n_timestamps, 100, replace=False))
+    params = {
+        'amplitude': {'mean': 2},
+        'frequency': {'mean': 3},
+        'phase': {'mean': 0, 'delta': 1},
+        'noise': noise,
+    }
+    wave = Wave(*features, label=1, **params)
+    wave.generate(ts, indices=indices)
+    assert len(wave) == len(indices)
+    assert wave.inputs.shape == (len(indices), len(features))
+    assert wave.labels.shape == (len(indices),)
+    assert np.all(wave.labels == 1)
+    if noise is not None:
+        assert wave.noise.shape == (len(indices),)
+    assert np.allclose(wave.timestamps, ts[indices])
+    assert np.allclose(wave.sample, wave.inputs[:, 0])
+    # the lazily evaluated full timeline agrees with the sparse evaluation.
+    assert wave.inputs_full.shape == (n_timestamps, len(features))
+    assert np.allclose(wave.inputs_full[indices], wave.inputs)
+    assert np.allclose(wave.sample_full[indices], wave.sample)
+    if noise is not None:
+        # the full noise keeps the wave's own noise, and drawing the rest doesn't move the wave's rng on.
+        state = wave.rng.bit_generator.state
+        wave._noise_full = None
+        assert np.array_equal(wave.noise_full[indices], wave.noise)
+        assert wave.rng.bit_generator.state == state
+        assert len(np.unique(wave.noise_full)) == n_timestamps
+
+
 def test_wave_raises_invalid_feature():
     n_timestamps = 201
     features = ('dydz2',)
@@ -304,6 +425,107 @@ def test_wave_raises_invalid_feature():
         _ = wave.inputs
 
 
+@pytest.mark.parametrize('noise', [None, {'uniform': {'mu': 0.0, 'delta': 0.5}}], ids=repr)
+def test_wave_generate_batch(noise):
+    n_timestamps = 201
+    batch_size = 8
+    features = ('x', 'dxdt', 'd2xdt2', 'd3xdt3')
+    sequence_generator = timesequence_generator(t_min=0.0, t_max=2.0, n_max=n_timestamps)
+    ts = sequence_generator()
+    params = {
+        'amplitude': {'mean': 1, 'delta': 0.5},
+        'frequency': {'mean': 1, 'delta': 0.5},
+        'phase': {'mean': 0, 'delta': 1},
+        'noise': noise,
+    }
+    wave = Wave(*features, label=2, **params)
+    inputs, labels = wave.generate_batch(batch_size, ts)
+    assert inputs.shape == (batch_size, n_timestamps, len(features))
+    assert labels.shape == (batch_size, n_timestamps)
+    assert np.all(labels == 2)
+    assert not np.allclose(inputs[0], inputs[1])
+    if noise is None:
+        # with no offset, x and d2xdt2 always have opposite signs.
+        assert np.all(inputs[..., 0] * inputs[..., 2] <= 1e-12)
+
+
+def test_wave_generate_batch_matches_generate():
+    n_timestamps = 201
+    features = ('x', 'dxdt', 'd2xdt2', 'd3xdt3', 'time')
+    params = {
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': n_timestamps},
+        'amplitude': {'mean': 2},
+        'frequency': {'mean': 3},
+        'offset': {'mean': 1},
+        'phase': {'mean': 0.25},
+    }
+    wave = Wave(*features, label=0, **params)
+    inputs, labels = wave.generate_batch(3)
+    wave.generate()
+    for i in range(3):
+        assert np.allclose(inputs[i], wave.inputs)
+
+
+def test_wave_generate_reuses_deterministic_arrays():
+    features = ('x', 'dxdt', 'd2xdt2')
+    params = {
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201},
+        'amplitude': {'mean': 2},
+        'frequency': {'mean': 3},
+        'phase': {'mean': 0.25},
+    }
+    wave = Wave(*features, label=0, **params)
+    wave.generate()
+    inputs = wave.inputs
+    wave.generate()
+    assert wave.inputs is inputs
+
+    wave = Wave(*features, label=0, noise={'normal': {'mu': 0, 'sigma': 0.1}}, **params)
+    wave.generate()
+    inputs = wave.inputs
+    wave.generate()
+    assert wave.inputs is not inputs
+
+
+def test_wave_generate_random_phase_matches_direct():
+    features = ('x', 'dxdt', 'd2xdt2', 'd3xdt3')
+    params = {
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201},
+        'amplitude': {'mean': 2, 'delta': 1},
+        'frequency': {'mean': 3},
+        'phase': {'mean': 0.5, 'delta': 0.5},
+    }
+    wave = Wave(*features, label=0, rng=7, **params)
+    for _ in range(4):
+        wave.generate()
+        a, w, o, p = wave._wp
+        theta = w * wave.timestamps - p
+        expected = np.stack([a * np.sin(theta), a * w * np.cos(theta),
+                             -a * w ** 2 * np.sin(theta), -a * w ** 3 * np.cos(theta)], axis=1)
+        assert np.allclose(wave.inputs, expected + np.array([o, 0, 0, 0]))
+    assert 'sin' in wave._trig_cache
+
+
+@pytest.mark.parametrize('params,cached', [
+    ({'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201}}, True),
+    ({'time': {'t_min': 0, 't_max': 2, 'n_min': 201, 'n_max': 201}}, True),
+    ({'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201}, 'frequency': {'mean': 3, 'delta': 1}}, False),
+    ({'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201, 'noise_type': 'jitter'}}, False),
+    ({'time': {'t_min': 0, 't_max': 2, 'n_min': 101, 'n_max': 201}}, False),
+    ({}, False),  # a mixed wave constituent: its timestamps are new every call.
+], ids=repr)
+def test_wave_trig_cache_only_for_fixed_timestamps_and_frequency(params, cached):
+    wave = Wave('x', 'dxdt', label=0, phase={'mean': 0, 'delta': 1}, **params)
+    assert (wave._trig_cache is not None) == cached
+
+
+def test_wave_generate_batch_variable_length_error():
+    params = {'time': {'t_min': 0, 't_max': 2, 'n_min': 100, 'n_max': 200}}
+    wave = Wave(**params)
+    with pytest.raises(ValueError):
+        wave.generate_batch(16)
+
+
 @pytest.mark.parametrize('n_classes', [1, 2, 3], ids=repr)
 @pytest.mark.parametrize('n_features', [1, 2, 3], ids=repr)
 def test_mixedwave_features_and_classes(n_features, n_classes):
@@ -329,3 +551,30 @@ def test_mixedwave_features_and_classes(n_features, n_classes):
     # i_timestamp = np.random.randint(n_timestamps)
     # i_label = mwave.labels[i_timestamp]
     # assert mwave.one_hots[i_timestamp][i_label] == 1
+
+
+def test_wave_pickle():
+    params = {
+        'time': {'t_min': 0, 't_max': 2, 'n_timestamps': 201, 'noise_type': 'jitter'},
+        'amplitude': {'mean': 2, 'delta': 1},
+        'frequency': {'mean': 3, 'delta': 1, 'distribution': 'loguniform'},
+        'phase': {'mean': 0, 'delta': 1},
+        'noise': {'normal': {'mu': 0, 'sigma': 0.1}},
+        'kernel': {'name': 'damped_sine', 'damping': 0.5},
+    }
+    wave = Wave('x', 'dxdt', label=1, rng=3, dtype='float32', **params)
+    wave.generate()
+    copied = pickle.loads(pickle.dumps(wave))
+    assert len(pickle.dumps(wave)) < 4096
+    assert copied.name == wave.name and copied.color == wave.color
+    assert copied.kernel == wave.kernel and copied.features == wave.features
+    for _ in range(2):
+        wave.generate()
+        copied.generate()
+        assert np.array_equal(copied.inputs, wave.inputs)
+        assert np.array_equal(copied.labels, wave.labels)
+        assert copied.inputs.dtype == np.float32
+
+    prop = Frequency(mean=2, delta=1, distribution='normal', rng=5)
+    copied = pickle.loads(pickle.dumps(prop))
+    assert np.array_equal(copied.sample(10), prop.sample(10))